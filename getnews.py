@@ -1,20 +1,39 @@
 #!/usr/bin/env python3
 import os
+import sys
 import json
-import html2text
+import argparse
+import hashlib
+import time
 import requests
-import yaml
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
+from requests.adapters import HTTPAdapter
 from urllib.parse import urljoin
+from urllib3.util.retry import Retry
+
+# nieuws.hugo doesn't need Django, so it is imported straight from the Wagtail project
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "wagtail"))
+from nieuws.hugo import render_post, write_file_atomic  # noqa: E402
 
 # Configuration
 API_URL = "http://127.0.0.1:8000/api/v2/"
 PAGES_ENDPOINT = urljoin(API_URL, "pages/")
+EXPORT_ENDPOINT = urljoin(API_URL, "news/export/")
+MANIFEST_ENDPOINT = urljoin(API_URL, "news/manifest/")
 OUTPUT_DIR = "C:\\dev\\hugo\\moosedept\\content\\nieuws"
-HTML_CONVERTER = html2text.HTML2Text()
-HTML_CONVERTER.ignore_links = False
-HTML_CONVERTER.ignore_images = False
-HTML_CONVERTER.body_width = 0  # Don't wrap lines
+STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "getnews-state.json")
+PAGE_FIELDS = "date,body,body_html,tags,last_published_at"
+FETCH_WORKERS = 4
+RENDER_WORKERS = os.cpu_count() or 1
+FETCH_RETRIES = Retry(
+    total=5,
+    backoff_factor=0.5,
+    status_forcelist=[429, 500, 502, 503, 504],
+    allowed_methods=["GET"],
+)
+SESSION = None
 
 def ensure_dir_exists(directory):
     """Make sure the output directory exists."""
@@ -22,9 +41,56 @@ def ensure_dir_exists(directory):
         os.makedirs(directory)
         print(f"Created directory: {directory}")
 
+def get_session():
+    """Get the shared keep-alive session, with a connection per fetch worker."""
+    global SESSION
+    if SESSION is None:
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=FETCH_WORKERS,
+            max_retries=FETCH_RETRIES,
+        )
+        SESSION = requests.Session()
+        SESSION.mount("http://", adapter)
+        SESSION.mount("https://", adapter)
+    return SESSION
+
+def fetch_listing(params):
+    """
+    Get every item of an API listing.
+    
+    The first request tells us the total count and the page size the server
+    allows; the remaining offsets are then requested concurrently and put back
+    together in offset order, so the server's ordering is kept.
+    """
+    session = get_session()
+    
+    def fetch(offset):
+        response = session.get(PAGES_ENDPOINT, params={**params, "offset": offset})
+        if response.status_code != 200:
+            print(f"API Error: {response.status_code}")
+            print(f"Response: {response.text}")
+            response.raise_for_status()
+        return response.json()
+    
+    first = fetch(0)
+    items = first['items']
+    total_count = first['meta']['total_count']
+    page_size = len(items)
+    if not page_size or page_size >= total_count:
+        return items
+    
+    offsets = range(page_size, total_count, page_size)
+    print(f"Fetching {total_count} items in {len(offsets) + 1} requests...")
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+        for data in executor.map(fetch, offsets):
+            items.extend(data['items'])
+    
+    return items
+
 def get_news_index():
     """Find the news index page."""
-    response = requests.get(
+    response = get_session().get(
         PAGES_ENDPOINT, 
         params={"type": "nieuws.Index", "fields": "id,title"}
     )
@@ -37,105 +103,285 @@ def get_news_index():
     return data['items'][0]['id']
 
 def get_all_news_pages(index_id):
-    """Get all news pages from the API."""
-    all_pages = []
-    # Use the correct format for requesting fields in Wagtail API
-    # Add order=-date to ensure we get the newest items first within the 20-item limit
-    next_url = f"{PAGES_ENDPOINT}?type=nieuws.NewsPage&child_of={index_id}&fields=date,body,tags&order=-date"
-    
-    while next_url:
-        print(f"Requesting: {next_url}")
-        response = requests.get(next_url)
-        
-        if response.status_code != 200:
-            print(f"API Error: {response.status_code}")
-            print(f"Response: {response.text}")
-            response.raise_for_status()
-            
-        data = response.json()
-        all_pages.extend(data['items'])
-        next_url = data.get('next')
-        
-        if next_url:
-            print(f"Fetched {len(all_pages)} pages, getting more...")
+    """Get all news pages from the API, newest first."""
+    return fetch_listing({
+        "type": "nieuws.NewsPage",
+        "child_of": index_id,
+        "fields": PAGE_FIELDS,
+        # id breaks ties between posts with the same date, which could
+        # otherwise land on two offsets or on none
+        "order": "-date,-id",
+    })
+
+def get_all_news_pages_bulk():
+    """Get all news pages in one request from the streaming export endpoint."""
+    news_pages = []
+    with get_session().get(EXPORT_ENDPOINT, stream=True) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            page = json.loads(line)
+            # Same shape as the items of the pages endpoint
+            page['meta'] = {'slug': page.pop('slug')}
+            news_pages.append(page)
+    return news_pages
+
+def get_page_manifest():
+    """Get the slug and publish time of every news page by id, in one request."""
+    response = get_session().get(MANIFEST_ENDPOINT)
+    response.raise_for_status()
+    return response.json()['pages']
+
+def get_news_page(page_id):
+    """Get a single news page with all exported fields."""
+    response = get_session().get(f"{PAGES_ENDPOINT}{page_id}/", params={"fields": PAGE_FIELDS})
+    response.raise_for_status()
+    return response.json()
+
+def load_state():
+    """Load the export state written by the previous run, if any."""
+    if not os.path.exists(STATE_FILE):
+        return {'pages': {}}
+    with open(STATE_FILE, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+def save_state(state):
+    """Write the export state for the next incremental run."""
+    with open(STATE_FILE, 'w', encoding='utf-8') as file:
+        json.dump(state, file, indent=2, sort_keys=True)
+
+def content_hash(content):
+    """Hash the bytes of a Markdown file so we can tell whether it changed."""
+    return hashlib.sha256(content).hexdigest()
+
+def parse_date(date_str):
+    """Parse an API date to a naive datetime, keeping its wall clock time for Hugo."""
+    # Handles both UTC 'Z' format and timezone offsets like '-05:00'
+    return datetime.fromisoformat(date_str.replace('Z', '+00:00')).replace(tzinfo=None)
+
+def render_markdown(news_page):
+    """Convert a news page to the Markdown file contents."""
+    date = parse_date(news_page['date']) if news_page.get('date') else datetime.now()
+    # Prefer the pre-rendered body, which has its internal links resolved
+    body_html = news_page.get('body_html') or news_page.get('body', '')
+    return render_post(news_page['title'], date, news_page.get('tags') or [], body_html)
+
+def render_pages(news_pages, workers):
+    """Render several pages, spreading the conversion over a process pool."""
+    if workers <= 1 or len(news_pages) <= 1:
+        return [render_markdown(page) for page in news_pages]
     
-    return all_pages
+    chunksize = max(1, len(news_pages) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(render_markdown, news_pages, chunksize=chunksize))
 
-def html_to_markdown(html):
-    """Convert HTML to Markdown."""
-    if not html:
-        return ""
-    return HTML_CONVERTER.handle(html)
+def markdown_path(news_page):
+    """Get the output path for a news page."""
+    return os.path.join(OUTPUT_DIR, f"{news_page['meta']['slug']}.md")
 
-def format_date(date_str):
-    """Format date string to Hugo compatible format without timezone."""
+def file_hash(filename):
+    """Hash an existing Markdown file, or return None if there is none."""
+    if not os.path.exists(filename):
+        return None
+    with open(filename, 'rb') as file:
+        return content_hash(file.read())
+
+def create_markdown_file(news_page, content=None):
+    """
+    Convert a news page to Markdown and save it.
+    
+    Files whose contents would not change are left alone, so their mtime
+    stays put for Hugo and the deploy scripts. Returns the filename, the
+    content hash and whether the file was created, updated or unchanged.
+    """
+    if content is None:
+        content = render_markdown(news_page)
+    # Written as UTF-8 bytes, without newline translation, so the file hashes
+    # the same as the content on every platform
+    content = content.encode('utf-8')
+    
+    filename = markdown_path(news_page)
+    digest = content_hash(content)
+    existing_digest = file_hash(filename)
+    
+    if existing_digest == digest:
+        return filename, digest, 'unchanged'
+    
+    write_file_atomic(filename, content)
+    
+    if existing_digest is None:
+        print(f"Created: {filename}")
+        return filename, digest, 'created'
+    
+    print(f"Updated: {filename}")
+    return filename, digest, 'updated'
+
+@contextmanager
+def timed(timings, stage):
+    """Add the time spent in a block to the timings of a stage."""
+    start = time.perf_counter()
     try:
-        # Parse the date - handles both UTC 'Z' format and timezone offsets like '-05:00'
-        date_obj = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-        # Format it without timezone for Hugo
-        return date_obj.strftime('%Y-%m-%dT%H:%M:%S')
-    except (ValueError, AttributeError):
-        # If parsing fails, return the original string
-        return date_str
-
-def create_markdown_file(news_page):
-    """Convert a news page to Markdown and save it."""
-    title = news_page['title']
-    slug = news_page['meta']['slug']
-    
-    # Handle missing fields and format date
-    date_str = news_page.get('date', datetime.now().isoformat())
-    date_str = format_date(date_str)
-    body_html = news_page.get('body', '')
-    
-    # Handle tags - might be missing or null
-    tags = []
-    if 'tags' in news_page and news_page['tags']:
-        tags = news_page['tags']
-    
-    # Convert body HTML to Markdown
-    body_md = html_to_markdown(body_html)
-    
-    # Create frontmatter
-    frontmatter = {
-        'title': title,
-        'date': date_str,
-        'draft': False,
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+def print_counts(counts):
+    """Print how many files were created, updated and left unchanged."""
+    print(
+        f"{counts.get('created', 0)} created, {counts.get('updated', 0)} updated, "
+        f"{counts.get('unchanged', 0)} unchanged"
+    )
+
+def print_timings(timings):
+    """Print how long each stage of the export took."""
+    summary = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items())
+    print(f"Timings: {summary}")
+
+def state_entry(news_page, filename, digest):
+    """Build the state record for an exported page."""
+    return {
+        'slug': news_page['meta']['slug'],
+        'last_published_at': news_page.get('last_published_at'),
+        'hash': digest,
+        'path': filename,
     }
+
+def remove_markdown_file(filename):
+    """Remove an exported file that no longer has a live page behind it."""
+    if filename and os.path.exists(filename):
+        os.remove(filename)
+        print(f"Removed: {filename}")
+
+def export_all(index_id, bulk=False):
+    """Export every news page and record the state for later incremental runs."""
+    timings = {}
+    with timed(timings, 'fetch'):
+        if bulk:
+            news_pages = get_all_news_pages_bulk()
+        else:
+            news_pages = get_all_news_pages(index_id)
+    print(f"Found {len(news_pages)} news pages")
     
-    if tags:
-        frontmatter['tags'] = tags
+    with timed(timings, 'render'):
+        contents = render_pages(news_pages, RENDER_WORKERS)
     
-    # Format as YAML with markdown content
-    content = "---\n"
-    content += yaml.dump(frontmatter, allow_unicode=True, default_flow_style=False)
-    content += "---\n\n"
-    content += body_md
+    state = {'pages': {}}
+    counts = {}
+    with timed(timings, 'write'):
+        for page, content in zip(news_pages, contents):
+            filename, digest, status = create_markdown_file(page, content)
+            counts[status] = counts.get(status, 0) + 1
+            state['pages'][str(page['id'])] = state_entry(page, filename, digest)
+        save_state(state)
+    
+    print(f"Export complete! {len(news_pages)} pages exported to {OUTPUT_DIR}")
+    print_counts(counts)
+    print_timings(timings)
+
+def plan_sync(known_pages, manifest):
+    """
+    Compare the state file with the manifest.
+    
+    Returns the ids of the pages that are new, were published again (which
+    includes renames) or lost their file, and the ids of the pages that are
+    gone from the site.
+    """
+    changed = [
+        page_id for page_id, entry in manifest.items()
+        if page_id not in known_pages
+        or known_pages[page_id]['last_published_at'] != entry['last_published_at']
+        or not os.path.exists(known_pages[page_id]['path'])
+    ]
+    removed = [page_id for page_id in known_pages if page_id not in manifest]
+    return changed, removed
+
+def export_incremental():
+    """Only fetch and rewrite pages that are new or changed, remove deleted ones."""
+    timings = {}
+    state = load_state()
+    known_pages = state['pages']
+    with timed(timings, 'manifest'):
+        manifest = get_page_manifest()
+    print(f"Found {len(manifest)} news pages, {len(known_pages)} in state file")
     
-    # Save to file
-    filename = os.path.join(OUTPUT_DIR, f"{slug}.md")
-    with open(filename, 'w', encoding='utf-8') as file:
-        file.write(content)
+    changed, removed = plan_sync(known_pages, manifest)
+    
+    with timed(timings, 'fetch'):
+        with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+            news_pages = list(executor.map(get_news_page, changed))
+    
+    with timed(timings, 'render'):
+        contents = render_pages(news_pages, RENDER_WORKERS)
+    
+    counts = {}
+    with timed(timings, 'write'):
+        for page_id, page, content in zip(changed, news_pages, contents):
+            filename, digest, status = create_markdown_file(page, content)
+            counts[status] = counts.get(status, 0) + 1
+            
+            # The slug may have changed, which leaves the old file behind
+            previous = known_pages.get(page_id)
+            if previous and previous['path'] != filename:
+                remove_markdown_file(previous['path'])
+            
+            known_pages[page_id] = state_entry(page, filename, digest)
+        
+        for page_id in removed:
+            remove_markdown_file(known_pages.pop(page_id)['path'])
         
-    print(f"Created: {filename}")
-    return filename
+        save_state(state)
+    
+    print(f"Sync complete! {len(changed)} pages changed, {len(removed)} removed in {OUTPUT_DIR}")
+    print_counts(counts)
+    print_timings(timings)
+
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Export Wagtail news to Hugo Markdown.")
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help=f"Only export new, changed or deleted pages, using the state in {STATE_FILE}",
+    )
+    parser.add_argument(
+        '--bulk',
+        action='store_true',
+        help="Fetch all pages in one request from the NDJSON export endpoint",
+    )
+    parser.add_argument(
+        '--fetch-workers',
+        type=int,
+        default=FETCH_WORKERS,
+        help="Number of concurrent API requests (default: %(default)s)",
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=RENDER_WORKERS,
+        help="Number of processes converting HTML to Markdown (default: %(default)s)",
+    )
+    return parser.parse_args()
 
 def main():
     """Main function."""
+    global FETCH_WORKERS, RENDER_WORKERS
+    args = parse_args()
+    FETCH_WORKERS = max(1, args.fetch_workers)
+    RENDER_WORKERS = max(1, args.workers)
     print("Starting export of Wagtail news to Hugo Markdown...")
     ensure_dir_exists(OUTPUT_DIR)
     
     try:
-        index_id = get_news_index()
-        print(f"Found news index with ID: {index_id}")
-        
-        news_pages = get_all_news_pages(index_id)
-        print(f"Found {len(news_pages)} news pages")
-        
-        for page in news_pages:
-            create_markdown_file(page)
-            
-        print(f"Export complete! {len(news_pages)} files created in {OUTPUT_DIR}")
+        # The manifest covers every news page, so only full exports need the index
+        if args.incremental and os.path.exists(STATE_FILE):
+            export_incremental()
+        else:
+            if args.incremental:
+                print("No state file found, doing a full export first")
+            index_id = get_news_index()
+            print(f"Found news index with ID: {index_id}")
+            export_all(index_id, bulk=args.bulk)
         
     except Exception as e:
         print(f"Error: {e}")
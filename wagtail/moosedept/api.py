@@ -1,12 +1,118 @@
+import json
+
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.fields import DateTimeField
 from wagtail.api.v2.views import PagesAPIViewSet
 from wagtail.api.v2.router import WagtailAPIRouter
 from wagtail.images.api.v2.views import ImagesAPIViewSet
 from wagtail.documents.api.v2.views import DocumentsAPIViewSet
+from wagtail.models import Page
+
+from nieuws.models import NewsPage
+
+from .conditional import conditional_response, listing_validators, page_validators
+
+
+class ConditionalPagesAPIViewSet(PagesAPIViewSet):
+    """The pages endpoint, answering 304 Not Modified to clients that are up to date."""
+    def listing_view(self, request):
+        return conditional_response(
+            request,
+            lambda: listing_validators(Page.objects.all()),
+            lambda: super(ConditionalPagesAPIViewSet, self).listing_view(request),
+        )
+
+    def get_object(self):
+        # The validators, detail_view() and get_serializer_class() all ask for
+        # the page; a view set instance handles a single request
+        if not hasattr(self, 'page'):
+            self.page = super().get_object()
+        return self.page
+
+    def detail_view(self, request, pk):
+        page = self.get_object()
+        return conditional_response(
+            request,
+            lambda: page_validators(page),
+            lambda: super(ConditionalPagesAPIViewSet, self).detail_view(request, pk),
+        )
+
 
 # Create the router
 api_router = WagtailAPIRouter('wagtailapi')
 
 # Add the endpoints
-api_router.register_endpoint('pages', PagesAPIViewSet)
+api_router.register_endpoint('pages', ConditionalPagesAPIViewSet)
 api_router.register_endpoint('images', ImagesAPIViewSet)
 api_router.register_endpoint('documents', DocumentsAPIViewSet)
+
+# Rows fetched from the database at a time by the bulk export
+EXPORT_CHUNK_SIZE = 200
+
+
+# Renders dates exactly like the pages endpoint, so they compare as strings
+API_DATETIME_FIELD = DateTimeField()
+
+
+def api_datetime(value):
+    return API_DATETIME_FIELD.to_representation(value)
+
+
+def iter_news_export():
+    """
+    Yield every live news page as one line of JSON, newest first.
+
+    Dates are rendered in the current time zone, the same way the pages
+    endpoint does, so both can be compared as strings. Pages that were never
+    published through Wagtail have a null last_published_at, as there.
+    """
+    news_pages = (
+        NewsPage.objects.live().public()
+        .order_by('-date', '-id')
+        .prefetch_related('tags')
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    for news_page in news_pages:
+        row = {
+            'id': news_page.id,
+            'title': news_page.title,
+            'slug': news_page.slug,
+            'date': api_datetime(news_page.date),
+            'body': news_page.body,
+            'body_html': news_page.body_html or news_page.render_body(),
+            'tags': sorted(tag.name for tag in news_page.tags.all()),
+            'last_published_at': api_datetime(news_page.last_published_at),
+        }
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+@require_GET
+def news_export(request):
+    """
+    Stream all live news pages as newline-delimited JSON.
+
+    Unlike the paginated pages endpoint this is a single request, and rows are
+    read in chunks so memory use does not grow with the size of the archive.
+    """
+    return StreamingHttpResponse(
+        iter_news_export(),
+        content_type='application/x-ndjson; charset=utf-8',
+    )
+
+
+@require_GET
+def news_manifest(request):
+    """
+    The slug and publish time of every live news page, by id, in one response.
+
+    getnews.py --incremental compares this with its state file to find the
+    pages to fetch again. A single query; no bodies are read.
+    """
+    rows = NewsPage.objects.live().public().order_by('id').values_list('id', 'slug', 'last_published_at')
+    return JsonResponse({
+        'pages': {
+            str(page_id): {'slug': slug, 'last_published_at': api_datetime(last_published_at)}
+            for page_id, slug, last_published_at in rows
+        },
+    })
@@ -0,0 +1,121 @@
+"""
+Full-page cache for the public site.
+
+Anonymous GET requests are answered from the "pages" cache, keyed on path
+and query string. Each path has a version number in the cache, so purging a
+path drops every query string variant of it at once; paths below one of the
+PAGE_CACHE_GROUPS prefixes share a single version. purge_all() bumps a
+version shared by all paths. Purges are triggered by the publish signals in
+nieuws.signals.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+ALL_PAGES = '*'
+
+
+def page_cache():
+    return caches[getattr(settings, 'PAGE_CACHE_ALIAS', 'pages')]
+
+
+def page_cache_timeout():
+    return getattr(settings, 'PAGE_CACHE_TIMEOUT', 3600)
+
+
+def purge_group(path):
+    """The path whose version covers this path."""
+    for prefix in getattr(settings, 'PAGE_CACHE_GROUPS', []):
+        if path.startswith(prefix):
+            return prefix
+    return path
+
+
+def version_key(group):
+    return f'pagecache:version:{hashlib.md5(group.encode("utf-8")).hexdigest()}'
+
+
+def response_key(request):
+    """The cache key for a request, for the current versions of its path."""
+    keys = [version_key(ALL_PAGES), version_key(purge_group(request.path))]
+    versions = page_cache().get_many(keys)
+    full_path = hashlib.md5(request.get_full_path().encode('utf-8')).hexdigest()
+    return f'pagecache:{versions.get(keys[0], 0)}:{versions.get(keys[1], 0)}:{full_path}'
+
+
+def purge_paths(paths):
+    """Drop the cached responses for these paths, with any query string."""
+    groups = {purge_group(path) for path in paths if path}
+    if groups:
+        version = time.time_ns()
+        page_cache().set_many({version_key(group): version for group in groups}, None)
+
+
+def purge_all():
+    page_cache().set(version_key(ALL_PAGES), time.time_ns(), None)
+
+
+def last_purge_all():
+    """The time of the last purge_all() in nanoseconds, or 0."""
+    return page_cache().get(version_key(ALL_PAGES), 0)
+
+
+def is_cacheable_request(request):
+    if request.method not in ('GET', 'HEAD') or page_cache_timeout() == 0:
+        return False
+    if request.path.startswith(tuple(getattr(settings, 'PAGE_CACHE_EXCLUDE', []))):
+        return False
+    # Editors see the user bar and draft-related links; password-protected
+    # pages are unlocked through the session
+    if request.user.is_authenticated or settings.SESSION_COOKIE_NAME in request.COOKIES:
+        return False
+    return True
+
+
+def is_cacheable_response(request, response):
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return False
+    if getattr(request, 'in_preview_panel', False):
+        return False
+    cache_control = response.get('Cache-Control', '')
+    return 'private' not in cache_control and 'no-cache' not in cache_control
+
+
+class PageCacheMiddleware:
+    """
+    Serve anonymous page views from the page cache.
+
+    Must come after AuthenticationMiddleware. Adds an X-Page-Cache header
+    saying whether the response was a hit or a miss. Cached responses with
+    an ETag or Last-Modified header answer conditional requests with 304.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not is_cacheable_request(request):
+            return self.get_response(request)
+
+        key = response_key(request)
+        cached = page_cache().get(key)
+        if cached is not None:
+            content, headers = cached
+            response = HttpResponse(content, headers=headers)
+            response['X-Page-Cache'] = 'hit'
+            return get_conditional_response(
+                request,
+                etag=headers.get('ETag'),
+                last_modified=parse_http_date_safe(headers.get('Last-Modified')),
+                response=response,
+            ) or response
+
+        response = self.get_response(request)
+        if is_cacheable_response(request, response):
+            page_cache().set(key, (response.content, dict(response.items())), page_cache_timeout())
+            response['X-Page-Cache'] = 'miss'
+        return response
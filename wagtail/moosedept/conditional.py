@@ -0,0 +1,87 @@
+"""
+Conditional GET (ETag / Last-Modified) for pages and listings.
+
+Validators are cheap to work out from publish times, so a client that
+already has the current version gets a 304 Not Modified without anything
+being rendered. Changes that can show up on any page, such as a renamed tag
+or a moved index, call purge_all(); its time is part of every validator.
+Works like django.views.decorators.http.condition, but for page serve()
+methods and API views, which can't take the decorator.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+from .cache import last_purge_all
+
+
+def with_last_purge_all(etag, last_modified):
+    """Validators that also change whenever purge_all() is called."""
+    purged = last_purge_all()
+    if not purged:
+        return quote_etag(etag), last_modified
+    last_modified = latest(last_modified, datetime.fromtimestamp(purged / 10**9, tz=dt_timezone.utc))
+    return quote_etag(f'{etag}-{purged}'), last_modified
+
+
+def page_validators(page):
+    """The ETag and Last-Modified of a live page."""
+    return with_last_purge_all(f'{page.id}-{page.live_revision_id}', page.last_published_at)
+
+
+def latest(*times):
+    times = [value for value in times if value is not None]
+    return max(times) if times else None
+
+
+def listing_validators(pages, parent=None, changed_at=None):
+    """
+    The ETag and Last-Modified of a listing of live pages.
+
+    The newest publish time changes whenever a page is published and the
+    count whenever one is unpublished, so together they version the listing.
+    Unpublishing doesn't move the newest publish time forward, though, so
+    changed_at, when the listing last lost or gained a page, keeps
+    Last-Modified moving for clients that only send If-Modified-Since.
+    """
+    listed = pages.live().aggregate(newest=Max('last_published_at'), count=Count('id'))
+    etag = f"{listed['count']}-{listed['newest'].timestamp() if listed['newest'] else 0}"
+    last_modified = latest(listed['newest'], changed_at)
+    if changed_at is not None:
+        etag = f'{etag}-{changed_at.timestamp()}'
+    if parent is not None:
+        etag = f'{parent.id}-{parent.live_revision_id}-{etag}'
+        last_modified = latest(last_modified, parent.last_published_at)
+    return with_last_purge_all(etag, last_modified)
+
+
+def set_validators(response, etag, last_modified):
+    if last_modified and not response.has_header('Last-Modified'):
+        response.headers['Last-Modified'] = http_date(last_modified.timestamp())
+    if etag:
+        response.headers.setdefault('ETag', etag)
+
+
+def conditional_response(request, validators, render):
+    """
+    Answer 304 Not Modified if the client has the current version, else render.
+
+    validators is a callable returning (etag, last_modified), render one
+    returning the full response. Previews are always rendered.
+    """
+    if request.method not in ('GET', 'HEAD') or getattr(request, 'is_preview', False):
+        return render()
+
+    etag, last_modified = validators()
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+    if response is None:
+        response = render()
+    if response.status_code in (200, 304):
+        set_validators(response, etag, last_modified)
+    return response
@@ -60,6 +60,7 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "wagtail.contrib.redirects.middleware.RedirectMiddleware",
+    "moosedept.cache.PageCacheMiddleware",
 ]
 
 ROOT_URLCONF = "moosedept.urls"
@@ -96,6 +97,38 @@ DATABASES = {
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# The "pages" cache holds whole rendered pages (see moosedept/cache.py). The
+# default cache holds the generation numbers that invalidate the cached
+# listings, tag clouds, fragments and search results. Both are file based so
+# every server process and management command sees the same purges.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(BASE_DIR, "cache", "default"),
+        "OPTIONS": {
+            "MAX_ENTRIES": 10_000,
+        },
+    },
+    "pages": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(BASE_DIR, "cache", "pages"),
+        "OPTIONS": {
+            "MAX_ENTRIES": 10_000,
+        },
+    },
+}
+
+# Seconds a rendered page is kept; 0 turns the page cache off
+PAGE_CACHE_TIMEOUT = 60 * 60
+# Paths that are never cached
+PAGE_CACHE_EXCLUDE = ["/admin/", "/django-admin/", "/api/", "/search/", "/documents/", "/static/", "/media/"]
+# Paths below these prefixes are purged together
+PAGE_CACHE_GROUPS = ["/nieuws/page/"]
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -171,8 +204,44 @@ WAGTAIL_SITE_NAME = "moosedept"
 WAGTAILSEARCH_BACKENDS = {
     "default": {
         "BACKEND": "wagtail.search.backends.database",
-    }
+    },
+    # SQLite FTS5 index with BM25 ranking and Dutch stemming, used by the site
+    # search (see search/fts5.py). Column weights are relative.
+    "fts5": {
+        "BACKEND": "search.fts5",
+        "WEIGHTS": {"title": 10.0, "body": 1.0, "tags": 5.0},
+    },
 }
+# Backend used by search.views.search
+SEARCH_BACKEND = "fts5"
+# Seconds the result ids of a search are cached (in the default cache), and
+# how many are kept per query; later pages are searched for again. Publishing
+# or unpublishing any page invalidates them all.
+SEARCH_CACHE_TIMEOUT = 10 * 60
+SEARCH_CACHE_RESULTS = 200
+# Hugo content directory with the gekeken and gelezen logs, which the site
+# search also filters (see search/logs.py)
+SEARCH_LOGS_DIR = os.path.join(os.path.dirname(BASE_DIR), "content")
+# Seconds the filter choices on the search page may lag behind the log
+# files; searching the logs always checks them for changes
+SEARCH_LOGS_REFRESH_INTERVAL = 60
+
+# News
+# Use keyset (older/newer) pagination for the news archive instead of numbered
+# pages. The numbered /nieuws/page/<n>/ URLs keep working either way.
+NIEUWS_KEYSET_PAGINATION = False
+# Seconds a page of a news listing (its ids and count) stays cached. Any
+# change to the news drops them all sooner (see nieuws/listing.py).
+NIEUWS_LISTING_CACHE_TIMEOUT = 60 * 60
+# Cache for the rendered news rows and tag lists ({% pagefragment %}), which
+# also holds its hit and miss counters (manage.py fragment_cache_stats)
+NIEUWS_FRAGMENT_CACHE = "default"
+# Hugo content directory (e.g. content/nieuws in the Hugo site) where the
+# Markdown file of a news page is written or removed when it is published or
+# unpublished; None turns this off. Edits are written in batches, once none
+# has come in for NIEUWS_HUGO_DEBOUNCE seconds.
+NIEUWS_HUGO_CONTENT_DIR = None
+NIEUWS_HUGO_DEBOUNCE = 2.0
 
 # Base URL to use when referring to full URLs within the Wagtail admin backend -
 # e.g. in notification emails. Don't include '/admin' or a trailing slash
@@ -1,5 +1,5 @@
 from django.conf import settings
-from django.urls import include, path
+from django.urls import include, path, re_path
 from django.contrib import admin
 
 from wagtail.admin import urls as wagtailadmin_urls
@@ -7,17 +7,25 @@ from wagtail import urls as wagtail_urls
 from wagtail.documents import urls as wagtaildocs_urls
 
 from search import views as search_views
-from nieuws.views import tag_index, paginated_index
-from .api import api_router
+from nieuws.feeds import NewsFeed, TagNewsFeed
+from nieuws.views import tag_index, paginated_index, keyset_index
+from .api import api_router, news_export, news_manifest
 
 urlpatterns = [
     path("django-admin/", admin.site.urls),
     path("admin/", include(wagtailadmin_urls)),
     path("documents/", include(wagtaildocs_urls)),
     path("search/", search_views.search, name="search"),
+    path("search/suggest/", search_views.suggest, name="search_suggest"),
     path('tags/<slug:tag>/', tag_index, name='tag_index'),
+    path('tags/<slug:tag>/index.xml', TagNewsFeed(), name='tag_feed'),
+    path('tags/<slug:tag>/page/<int:page_number>/', tag_index, name='paginated_tag_index'),
+    path('nieuws/index.xml', NewsFeed(), name='news_feed'),
     path('nieuws/page/<int:page_number>/', paginated_index, name='paginated_news'),
+    re_path(r'^nieuws/page/(?P<direction>older|newer)/(?P<cursor>-?\d+\.\d+)/$', keyset_index, name='keyset_news'),
     # API endpoint
+    path('api/v2/news/export/', news_export, name='news_export'),
+    path('api/v2/news/manifest/', news_manifest, name='news_manifest'),
     path('api/v2/', api_router.urls),
 ]
 
@@ -0,0 +1,69 @@
+from django.contrib.syndication.views import Feed
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from taggit.models import Tag
+
+from .listing import get_news_index, news_queryset
+
+# Number of news items in a feed
+FEED_ITEMS = 20
+
+
+class NewsFeed(Feed):
+    """RSS feed of the newest news items, at the same URL as the old Hugo feed."""
+    def get_object(self, request):
+        news_index = get_news_index()
+        if not news_index:
+            raise Http404("No news index")
+        return news_index
+
+    def title(self, news_index):
+        return news_index.title
+
+    def link(self, news_index):
+        return news_index.url
+
+    def description(self, news_index):
+        return f"Recent nieuws: {news_index.title}"
+
+    def items(self, news_index):
+        return news_queryset(news_index)[:FEED_ITEMS]
+
+    def item_title(self, news_page):
+        return news_page.title
+
+    def item_description(self, news_page):
+        return news_page.body_html or news_page.render_body()
+
+    def item_link(self, news_page):
+        return news_page.url
+
+    def item_pubdate(self, news_page):
+        return news_page.date
+
+    def item_updateddate(self, news_page):
+        return news_page.last_published_at
+
+    def item_categories(self, news_page):
+        return [tag.name for tag in news_page.tags.all()]
+
+
+class TagNewsFeed(NewsFeed):
+    """RSS feed of the newest news items with one tag."""
+    def get_object(self, request, tag):
+        return get_object_or_404(Tag, slug=tag)
+
+    def title(self, tag):
+        return f"Nieuws over {tag.name}"
+
+    def link(self, tag):
+        return f"/tags/{tag.slug}/"
+
+    def description(self, tag):
+        return f"Recent nieuws over {tag.name}"
+
+    def items(self, tag):
+        news_index = get_news_index()
+        if not news_index:
+            return []
+        return news_queryset(news_index, tag.name)[:FEED_ITEMS]
@@ -0,0 +1,116 @@
+"""
+Reading and writing Hugo content files.
+
+Nothing in here touches the database or Django models, so these functions
+can run in worker processes started before Django is set up, and getnews.py
+can import them without Django.
+"""
+import os
+import re
+import tempfile
+
+import html2text
+import markdown
+import yaml
+
+
+def write_file_atomic(filename, content):
+    """
+    Write bytes through a temporary file in the same directory.
+
+    The rename is atomic, so Hugo or the web server never sees a half-written
+    file, even when the writer is interrupted.
+    """
+    directory, basename = os.path.split(filename)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{basename}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        # mkstemp creates files readable by the owner only
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, filename)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def parse_markdown(content):
+    """Extract frontmatter and markdown content from a markdown file."""
+    # Look for frontmatter between --- markers
+    frontmatter_match = re.match(r'^---\s*\n(.*?)\n---\s*\n(.*)', content, re.DOTALL)
+    
+    if frontmatter_match:
+        frontmatter_text = frontmatter_match.group(1)
+        markdown_content = frontmatter_match.group(2)
+        
+        try:
+            frontmatter = yaml.safe_load(frontmatter_text)
+            return frontmatter, markdown_content
+        except yaml.YAMLError:
+            return None, content
+    
+    return None, content
+
+
+def parse_post_file(md_file):
+    """
+    Read a Hugo post and convert its body to HTML.
+
+    Returns a dict with the file name, the frontmatter (None if there is
+    none) and the HTML body. Errors are returned under 'error' rather than
+    raised, so one broken file doesn't stop a pool of workers.
+    """
+    try:
+        with open(md_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+        
+        frontmatter, md_content = parse_markdown(content)
+        if not frontmatter:
+            return {'file': md_file, 'frontmatter': None}
+        
+        # Convert to HTML (simple conversion)
+        return {
+            'file': md_file,
+            'frontmatter': frontmatter,
+            'body': markdown.markdown(md_content),
+        }
+    except Exception as e:
+        return {'file': md_file, 'error': str(e)}
+
+
+def markdown_converter():
+    """The HTML to Markdown converter for post bodies."""
+    converter = html2text.HTML2Text()
+    converter.ignore_links = False
+    converter.ignore_images = False
+    converter.body_width = 0  # Don't wrap lines
+    return converter
+
+
+def html_to_markdown(html):
+    """Convert HTML to Markdown."""
+    if not html:
+        return ""
+    return markdown_converter().handle(html)
+
+
+def render_post(title, date, tags, body_html):
+    """
+    Render a post as a Hugo Markdown file, in the format getnews.py writes.
+
+    date should be a naive datetime in the site's time zone.
+    """
+    frontmatter = {
+        'title': title,
+        'date': date.strftime('%Y-%m-%dT%H:%M:%S'),
+        'draft': False,
+    }
+    if tags:
+        frontmatter['tags'] = list(tags)
+    
+    content = "---\n"
+    content += yaml.dump(frontmatter, allow_unicode=True, default_flow_style=False)
+    content += "---\n\n"
+    content += html_to_markdown(body_html)
+    return content
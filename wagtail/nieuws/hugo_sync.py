@@ -0,0 +1,156 @@
+"""
+Keep the Hugo content directory in step with published news pages.
+
+The signals in nieuws.signals queue each published, unpublished or deleted
+news page once its transaction commits. A background thread waits until no
+page has been queued for NIEUWS_HUGO_DEBOUNCE seconds, then writes or
+deletes the Markdown files of the whole batch. A batch that fails is logged
+and queued again, to be retried after RETRY_DELAY seconds. Turned off while
+NIEUWS_HUGO_CONTENT_DIR is None.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .hugo import render_post, write_file_atomic
+
+logger = logging.getLogger(__name__)
+
+RETRY_DELAY = 60
+
+
+def content_dir():
+    return getattr(settings, 'NIEUWS_HUGO_CONTENT_DIR', None)
+
+
+def debounce():
+    return getattr(settings, 'NIEUWS_HUGO_DEBOUNCE', 2.0)
+
+
+def markdown_path(directory, slug):
+    return os.path.join(directory, f"{slug}.md")
+
+
+def write_post(directory, news_page):
+    """Write the Markdown file of a news page. Returns False if it was already current."""
+    content = render_post(
+        news_page.title,
+        timezone.localtime(news_page.date).replace(tzinfo=None),
+        sorted(tag.name for tag in news_page.tags.all()),
+        news_page.body_html or news_page.render_body(),
+    ).encode('utf-8')
+    filename = markdown_path(directory, news_page.slug)
+    try:
+        with open(filename, 'rb') as f:
+            if f.read() == content:
+                return False
+    except FileNotFoundError:
+        pass
+    write_file_atomic(filename, content)
+    return True
+
+
+def remove_post(directory, slug):
+    """Remove the Markdown file for a slug. Returns False if there was none."""
+    try:
+        os.remove(markdown_path(directory, slug))
+    except FileNotFoundError:
+        return False
+    return True
+
+
+class HugoWriter:
+    """Collects changed news pages and writes their Markdown files in batches."""
+    def __init__(self):
+        self.condition = threading.Condition()
+        # Held while a batch is written, so flush() never overtakes the thread
+        self.processing = threading.Lock()
+        # Page id -> slugs the page had; their files go if the page isn't live
+        self.pending = {}
+        self.last_queued = 0
+        self.thread = None
+
+    def enqueue(self, page_id, *slugs):
+        with self.condition:
+            self.pending.setdefault(page_id, set()).update(slugs)
+            self.last_queued = time.monotonic()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='hugo-writer', daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def take(self):
+        with self.condition:
+            pending, self.pending = self.pending, {}
+        return pending
+
+    def requeue(self, pending):
+        """Put back a batch that couldn't be written, merged with what was queued since."""
+        with self.condition:
+            for page_id, slugs in pending.items():
+                self.pending.setdefault(page_id, set()).update(slugs)
+
+    def run(self):
+        try:
+            while True:
+                with self.condition:
+                    while not self.pending:
+                        self.condition.wait()
+                    # Wait for a quiet moment, so a burst of edits is written once
+                    while (remaining := self.last_queued + debounce() - time.monotonic()) > 0:
+                        self.condition.wait(remaining)
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception("Writing Hugo posts failed, retrying in %s seconds", RETRY_DELAY)
+                    time.sleep(RETRY_DELAY)
+                finally:
+                    connection.close()
+        finally:
+            # Should the thread die anyway, the next enqueue() starts another
+            with self.condition:
+                self.thread = None
+
+    def flush(self):
+        """
+        Write the queued pages now. Returns the number of files written and removed.
+
+        If that fails the batch is queued again before the error is raised.
+        """
+        with self.processing:
+            pending = self.take()
+            directory = content_dir()
+            if not pending or not directory:
+                return 0
+            try:
+                return self.write_batch(directory, dict(pending))
+            except Exception:
+                self.requeue(pending)
+                raise
+
+    def write_batch(self, directory, pending):
+        from .models import NewsPage
+
+        os.makedirs(directory, exist_ok=True)
+        changed = 0
+        live_pages = NewsPage.objects.live().filter(pk__in=pending).prefetch_related('tags')
+        for news_page in live_pages:
+            changed += write_post(directory, news_page)
+            # The file moves along when the slug has changed
+            for slug in pending.pop(news_page.pk) - {news_page.slug}:
+                changed += remove_post(directory, slug)
+        for slugs in pending.values():
+            for slug in slugs:
+                changed += remove_post(directory, slug)
+        return changed
+
+
+hugo_writer = HugoWriter()
+# Write whatever is still queued when the server stops
+atexit.register(hugo_writer.flush)
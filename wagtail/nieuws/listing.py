@@ -0,0 +1,142 @@
+"""
+The news listing shared by the news index page and the standalone views.
+
+The news index is resolved once per process, and each page of a listing is
+cached as a list of page ids keyed on (index, tag, page). Everything is keyed
+on a generation number that nieuws.signals bumps whenever a news page or tag
+changes or the index is moved, so nothing has to be deleted key by key.
+The generation lives in the shared default cache, so a bump reaches every
+process; the cached pages expire after NIEUWS_LISTING_CACHE_TIMEOUT seconds,
+so keys for stale generations, odd tags and cursors don't pile up.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+
+from .models import Index, NewsPage, TagArchiveEntry
+from .pagination import keyset_page, keyset_pagination_enabled, KeysetPage
+
+NEWS_PER_PAGE = 50
+GENERATION_KEY = 'nieuws:listing:generation'
+
+_news_index = (None, None)
+
+
+def get_generation():
+    return cache.get_or_set(GENERATION_KEY, time.time_ns, None)
+
+
+def listing_timeout():
+    return getattr(settings, 'NIEUWS_LISTING_CACHE_TIMEOUT', 60 * 60)
+
+
+def bump_generation():
+    """Invalidate all cached listings and the resolved news index."""
+    cache.set(GENERATION_KEY, time.time_ns(), None)
+
+
+def get_news_index():
+    """Get the live news index page, looking it up only when the generation changed."""
+    global _news_index
+    generation = get_generation()
+    resolved_generation, news_index = _news_index
+    if resolved_generation != generation:
+        news_index = Index.objects.live().first()
+        _news_index = (generation, news_index)
+    return news_index
+
+
+def news_queryset(news_index, tag=None):
+    """The live news pages below the index, newest first, with their tags."""
+    newspages = NewsPage.objects.live().child_of(news_index).order_by('-date', '-pk').prefetch_related('tags')
+    if tag:
+        newspages = newspages.filter(tags__name=tag)
+    return newspages
+
+
+def listing_ids(news_index, tag=None):
+    """
+    The ids of the listed news pages, newest first.
+
+    Tag archives are read from the TagArchiveEntry table, which only holds
+    live pages; it is not split per index, as the site has a single one.
+    """
+    if tag:
+        return TagArchiveEntry.objects.filter(tag__name=tag).order_by('-date', '-page_id').values_list('page_id', flat=True)
+    return news_queryset(news_index).values_list('pk', flat=True)
+
+
+def cache_prefix(news_index, tag):
+    # Tag names can contain anything, which not every cache backend accepts in keys
+    tag_key = hashlib.md5(tag.encode('utf-8')).hexdigest() if tag else ''
+    return f'nieuws:listing:{get_generation()}:{news_index.id}:{tag_key}'
+
+
+def fetch_in_order(ids):
+    """Fetch news pages with their tags, in the order of the ids."""
+    news_pages = NewsPage.objects.filter(pk__in=ids).prefetch_related('tags').in_bulk()
+    return [news_pages[pk] for pk in ids if pk in news_pages]
+
+
+def numbered_page(news_index, number, tag=None, per_page=NEWS_PER_PAGE):
+    """
+    Get a numbered page of the listing, like Paginator.page().
+
+    Invalid page numbers fall back to the first page, numbers past the end
+    to the last page.
+    """
+    ids_queryset = listing_ids(news_index, tag)
+    prefix = cache_prefix(news_index, tag)
+
+    paginator = Paginator(ids_queryset, per_page)
+    count = cache.get(f'{prefix}:count')
+    if count is None:
+        count = ids_queryset.count()
+        cache.set(f'{prefix}:count', count, listing_timeout())
+    paginator.count = count
+
+    try:
+        number = paginator.validate_number(number)
+    except PageNotAnInteger:
+        number = 1
+    except EmptyPage:
+        number = paginator.num_pages
+
+    ids_key = f'{prefix}:{per_page}:{number}'
+    ids = cache.get(ids_key)
+    if ids is None:
+        bottom = (number - 1) * per_page
+        ids = list(ids_queryset[bottom:bottom + per_page])
+        cache.set(ids_key, ids, listing_timeout())
+
+    return Page(fetch_in_order(ids), number, paginator)
+
+
+def cursor_page(news_index, direction='older', cursor=None, tag=None, per_page=NEWS_PER_PAGE):
+    """
+    Get a keyset page of the listing; see nieuws.pagination.
+
+    Raises ValueError for a malformed cursor.
+    """
+    key = f'{cache_prefix(news_index, tag)}:{per_page}:{direction}:{cursor or ""}'
+    cached = cache.get(key)
+    if cached is not None:
+        return KeysetPage(fetch_in_order(cached['ids']), cached['has_newer'], cached['has_older'], tag)
+
+    page = keyset_page(news_queryset(news_index, tag), per_page, direction, cursor, tag=tag)
+    cache.set(key, {
+        'ids': [news_page.pk for news_page in page],
+        'has_newer': page.has_newer,
+        'has_older': page.has_older,
+    }, listing_timeout())
+    return page
+
+
+def first_page(news_index, number=None, tag=None):
+    """The page a listing opens on: the first keyset page, or a numbered page."""
+    if keyset_pagination_enabled():
+        return cursor_page(news_index, tag=tag)
+    return numbered_page(news_index, number, tag)
@@ -0,0 +1,33 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from moosedept.cache import purge_all
+from nieuws.listing import bump_generation
+from nieuws.models import NewsPageTag, TagArchiveEntry
+
+class Command(BaseCommand):
+    help = 'Rebuild the tag archive table from the tags of all live news pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of rows per insert')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        tagged_items = (
+            NewsPageTag.objects.filter(content_object__live=True)
+            .values_list('tag_id', 'content_object_id', 'content_object__date')
+            .iterator(chunk_size=options['batch_size'])
+        )
+        
+        with transaction.atomic():
+            TagArchiveEntry.objects.all().delete()
+            TagArchiveEntry.objects.bulk_create(
+                (TagArchiveEntry(tag_id=tag_id, page_id=page_id, date=date) for tag_id, page_id, date in tagged_items),
+                batch_size=options['batch_size'],
+            )
+        bump_generation()
+        purge_all()
+        
+        count = TagArchiveEntry.objects.count()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f"Tag archive rebuilt: {count} entries in {elapsed:.2f}s"))
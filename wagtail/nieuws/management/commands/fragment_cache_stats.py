@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from nieuws.templatetags.nieuws_tags import get_counters, reset_counters
+
+class Command(BaseCommand):
+    help = 'Show the hit and miss counts of the news fragment cache, as last added to the cache by each process'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after showing them')
+
+    def handle(self, *args, **options):
+        counters = get_counters()
+        total = counters['hits'] + counters['misses']
+        ratio = counters['hits'] / total if total else 0
+        self.stdout.write(f"Hits: {counters['hits']}")
+        self.stdout.write(f"Misses: {counters['misses']}")
+        self.stdout.write(f"Hit ratio: {ratio:.1%}")
+        
+        if options['reset']:
+            reset_counters()
+            self.stdout.write(self.style.SUCCESS("Counters reset"))
@@ -1,22 +1,93 @@
 import os
-import re
 import glob
-import yaml
-import markdown
+import hashlib
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.contrib.contenttypes.models import ContentType
 from django.core.management.base import BaseCommand
+from django.db.models import F
 from django.utils import timezone
-from wagtail.models import Page
-from nieuws.models import Index, NewsPage, NewsPageTag
+from wagtail.models import Page, Revision
+from wagtail.search.backends import get_search_backends
+from moosedept.cache import purge_all
+from nieuws.hugo import parse_post_file
+from nieuws.listing import bump_generation
+from nieuws.models import Index, NewsPage, NewsPageTag, TagArchiveEntry
+from nieuws.signals import invalidate_tag_clouds
+from search.cache import bump_generation as bump_search_generation
 from django.utils.text import slugify
 from taggit.models import Tag
-from datetime import datetime
+from datetime import datetime, timezone as dt_timezone
 from django.db import transaction
 
+class TagCache:
+    """
+    Tags by name, loaded with one query.
+    
+    Missing tags are created with a single bulk insert, so resolving the tags
+    of a post costs no queries once its tags exist.
+    """
+    def __init__(self):
+        self.tags = {tag.name: tag for tag in Tag.objects.all()}
+        self.slugs = {tag.slug for tag in self.tags.values()}
+    
+    def ensure(self, tag_names):
+        """Create the tags that don't exist yet."""
+        new_tags = []
+        for tag_name in dict.fromkeys(tag_names):
+            if tag_name in self.tags:
+                continue
+            
+            # bulk_create skips Tag.save(), which is where taggit makes slugs unique
+            tag = Tag(name=tag_name)
+            slug = tag.slugify(tag_name)
+            i = 1
+            while slug in self.slugs:
+                slug = tag.slugify(tag_name, i)
+                i += 1
+            tag.slug = slug
+            
+            self.slugs.add(slug)
+            self.tags[tag_name] = tag
+            new_tags.append(tag)
+        
+        if new_tags:
+            Tag.objects.bulk_create(new_tags)
+    
+    def get(self, tag_names):
+        """Get the Tag objects for a list of names, creating missing ones."""
+        self.ensure(tag_names)
+        return [self.tags[tag_name] for tag_name in tag_names]
+
+
 class Command(BaseCommand):
     help = 'Import Hugo markdown posts from /nieuws to Wagtail NewsPage items'
 
     def add_arguments(self, parser):
         parser.add_argument('content_dir', type=str, help='Path to Hugo content directory (parent of /nieuws)')
+        parser.add_argument(
+            '--bulk',
+            action='store_true',
+            help='Parse all files first, then create pages, tags and revisions in batches in one transaction',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of pages inserted per batch in bulk mode (default: 500)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of processes parsing and converting markdown files (default: one per CPU)',
+        )
+        parser.add_argument(
+            '--upsert',
+            action='store_true',
+            help='Update existing pages whose title, date, body or tags changed instead of skipping them',
+        )
 
     def handle(self, *args, **options):
         content_dir = options['content_dir']
@@ -41,96 +112,333 @@ class Command(BaseCommand):
         
         self.stdout.write(self.style.SUCCESS(f"Found {len(markdown_files)} markdown files to process"))
         
+        parsed_files = self.parse_files(markdown_files, max(1, options['workers']))
+        upsert = options['upsert']
+        existing = self.load_existing(index_page, with_hashes=upsert)
+        self.tag_cache = TagCache()
+        
+        if options['bulk']:
+            self.bulk_import(index_page, parsed_files, max(1, options['batch_size']), existing, upsert)
+            return
+        
+        counts = {}
+        
         # Process each markdown file
-        for md_file in markdown_files:
+        for parsed in parsed_files:
+            md_file = parsed['file']
             try:
-                with open(md_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    
-                # Extract frontmatter and markdown content
-                frontmatter, md_content = self.parse_markdown(content)
-                
-                if not frontmatter:
-                    self.stdout.write(self.style.WARNING(f"No frontmatter found in {md_file}, skipping"))
+                post = self.read_post(parsed)
+                if post is None:
                     continue
                 
-                # Convert to HTML (simple conversion)
-                html_content = markdown.markdown(md_content)
-                
-                # Get file basename for slug if not specified in frontmatter
-                basename = os.path.basename(md_file)
-                file_slug = os.path.splitext(basename)[0]
-                
-                # Extract post data
-                title = frontmatter.get('title', file_slug)
-                
-                # First try to get slug directly from frontmatter
-                if 'slug' in frontmatter:
-                    slug = frontmatter['slug']
-                    self.stdout.write(self.style.SUCCESS(f"Using slug from frontmatter: {slug}"))
-                # If no slug in frontmatter, get it from the filename (Hugo behavior)
+                if post['slug'] in existing:
+                    status = self.update_page(existing[post['slug']], post) if upsert else self.skip_page(post)
                 else:
-                    slug = slugify(file_slug)
-                    self.stdout.write(self.style.SUCCESS(f"Using slug from filename: {slug}"))
-                
-                post_date = self.parse_date(frontmatter.get('date', None))
-                tags = frontmatter.get('tags', [])
-                draft = frontmatter.get('draft', False)
-                
-                if draft:
-                    self.stdout.write(f"Skipping draft post: {title}")
-                    continue
-                
-                # Create the page
-                with transaction.atomic():
-                    # Check if page with this slug already exists
-                    existing_pages = NewsPage.objects.filter(slug=slug)
-                    if existing_pages.exists():
-                        self.stdout.write(self.style.WARNING(f"Page with slug '{slug}' already exists, skipping: {title}"))
-                        continue
-                    
-                    # Create the page
-                    news_page = NewsPage(
-                        title=title,
-                        slug=slug,
-                        date=post_date,
-                        body=html_content,
-                    )
-                    
-                    # Add page to the correct location in site tree
-                    index_page.add_child(instance=news_page)
-                    
-                    # Add tags
-                    for tag_name in tags:
-                        news_page.tags.add(tag_name)
-                    
-                    # Publish the page
-                    revision = news_page.save_revision()
-                    revision.publish()
-                    
-                    self.stdout.write(self.style.SUCCESS(f"Created post: {title}"))
+                    status = self.create_page(index_page, post)
+                    existing[post['slug']] = None
+                counts[status] = counts.get(status, 0) + 1
                     
             except Exception as e:
                 self.stdout.write(self.style.ERROR(f"Error processing {md_file}: {str(e)}"))
         
-        self.stdout.write(self.style.SUCCESS("Import completed"))
+        self.stdout.write(self.style.SUCCESS(f"Import completed: {self.format_counts(counts)}"))
+    
+    def load_existing(self, index_page, with_hashes=False):
+        """
+        Map the slugs of the index page's news pages to their id and content hash.
+        
+        This is a single query. Without with_hashes only the slugs are loaded
+        and the values are None.
+        """
+        news_pages = NewsPage.objects.child_of(index_page)
+        if not with_hashes:
+            return dict.fromkeys(news_pages.values_list('slug', flat=True))
+        
+        # One row per (page, tag), or one row with a None tag for untagged pages
+        rows = news_pages.values_list('id', 'slug', 'title', 'date', 'body', 'tags__name')
+        pages = {}
+        for page_id, slug, title, date, body, tag_name in rows:
+            page = pages.setdefault(slug, {'id': page_id, 'title': title, 'date': date, 'body': body, 'tags': []})
+            if tag_name is not None:
+                page['tags'].append(tag_name)
+        
+        return {
+            slug: {'id': page['id'], 'hash': self.post_hash(page)}
+            for slug, page in pages.items()
+        }
+    
+    def post_hash(self, post):
+        """Hash the fields the importer manages, to tell whether a page changed."""
+        date = post['date']
+        if timezone.is_naive(date):
+            date = timezone.make_aware(date)
+        data = [
+            post['title'],
+            date.astimezone(dt_timezone.utc).isoformat(),
+            post['body'],
+            sorted(post['tags']),
+        ]
+        return hashlib.sha256(json.dumps(data).encode('utf-8')).hexdigest()
+    
+    def format_counts(self, counts):
+        """Summarise how many posts were created, updated, unchanged or skipped."""
+        return ", ".join(f"{counts.get(status, 0)} {status}" for status in ('created', 'updated', 'unchanged', 'skipped'))
+    
+    def skip_page(self, post):
+        """Leave an existing page alone."""
+        self.stdout.write(self.style.WARNING(f"Page with slug '{post['slug']}' already exists, skipping: {post['title']}"))
+        return 'skipped'
+    
+    def create_page(self, index_page, post):
+        """Create and publish a single page below the index page."""
+        with transaction.atomic():
+            # Create the page
+            news_page = NewsPage(
+                title=post['title'],
+                slug=post['slug'],
+                date=post['date'],
+                body=post['body'],
+            )
+            
+            # Add page to the correct location in site tree
+            index_page.add_child(instance=news_page)
+            
+            # Add tags
+            news_page.tags.add(*self.tag_cache.get(post['tags']))
+            
+            # Publish the page
+            revision = news_page.save_revision()
+            revision.publish()
+            
+        self.stdout.write(self.style.SUCCESS(f"Created post: {post['title']}"))
+        return 'created'
     
-    def parse_markdown(self, content):
-        """Extract frontmatter and markdown content from a markdown file."""
-        # Look for frontmatter between --- markers
-        frontmatter_match = re.match(r'^---\s*\n(.*?)\n---\s*\n(.*)', content, re.DOTALL)
-        
-        if frontmatter_match:
-            frontmatter_text = frontmatter_match.group(1)
-            markdown_content = frontmatter_match.group(2)
+    def update_page(self, existing_page, post):
+        """Publish a new revision of an existing page, but only if the post changed."""
+        if existing_page['hash'] == self.post_hash(post):
+            return 'unchanged'
+        
+        with transaction.atomic():
+            news_page = NewsPage.objects.get(id=existing_page['id'])
+            news_page.title = post['title']
+            news_page.date = post['date']
+            news_page.body = post['body']
+            news_page.tags.set(self.tag_cache.get(post['tags']))
             
+            revision = news_page.save_revision()
+            revision.publish()
+        
+        self.stdout.write(self.style.SUCCESS(f"Updated post: {post['title']}"))
+        return 'updated'
+    
+    def parse_files(self, markdown_files, workers):
+        """
+        Parse and convert markdown files, yielding the results in file order.
+        
+        The CPU-heavy part runs in a process pool; the caller is the only one
+        writing to the database, which keeps SQLite happy.
+        """
+        if workers <= 1 or len(markdown_files) <= 1:
+            for md_file in markdown_files:
+                yield parse_post_file(md_file)
+            return
+        
+        chunksize = max(1, len(markdown_files) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            yield from executor.map(parse_post_file, markdown_files, chunksize=chunksize)
+    
+    def read_post(self, parsed):
+        """Turn a parsed markdown file into the values for a NewsPage, or None if it should be skipped."""
+        md_file = parsed['file']
+        if 'error' in parsed:
+            raise ValueError(parsed['error'])
+        
+        frontmatter = parsed['frontmatter']
+        if not frontmatter:
+            self.stdout.write(self.style.WARNING(f"No frontmatter found in {md_file}, skipping"))
+            return None
+        
+        html_content = parsed['body']
+        
+        # Get file basename for slug if not specified in frontmatter
+        basename = os.path.basename(md_file)
+        file_slug = os.path.splitext(basename)[0]
+        
+        # Extract post data
+        title = frontmatter.get('title', file_slug)
+        
+        # First try to get slug directly from frontmatter
+        if 'slug' in frontmatter:
+            slug = frontmatter['slug']
+            self.stdout.write(self.style.SUCCESS(f"Using slug from frontmatter: {slug}"))
+        # If no slug in frontmatter, get it from the filename (Hugo behavior)
+        else:
+            slug = slugify(file_slug)
+            self.stdout.write(self.style.SUCCESS(f"Using slug from filename: {slug}"))
+        
+        post_date = self.parse_date(frontmatter.get('date', None))
+        tags = frontmatter.get('tags', [])
+        draft = frontmatter.get('draft', False)
+        
+        if draft:
+            self.stdout.write(f"Skipping draft post: {title}")
+            return None
+        
+        return {
+            'title': title,
+            'slug': slug,
+            'date': post_date,
+            'body': html_content,
+            'tags': tags or [],
+        }
+    
+    def bulk_import(self, index_page, parsed_files, batch_size, existing, upsert):
+        """
+        Import all posts with a fixed number of queries per batch.
+        
+        All files are parsed up front. Tree paths for the new pages are
+        allocated in memory after the index page's last child, and pages,
+        revisions and tags are inserted with bulk queries inside a single
+        transaction. Audit log entries are not written in this mode.
+        Changed pages are still updated one by one when upserting.
+        """
+        start = time.perf_counter()
+        
+        posts = []
+        for parsed in parsed_files:
             try:
-                frontmatter = yaml.safe_load(frontmatter_text)
-                return frontmatter, markdown_content
-            except yaml.YAMLError:
-                return None, content
+                post = self.read_post(parsed)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"Error processing {parsed['file']}: {str(e)}"))
+                continue
+            if post is not None:
+                posts.append(post)
+        
+        # Slugs have to be unique among the children of the index page
+        taken_slugs = set(existing)
+        new_posts = []
+        existing_posts = []
+        counts = {}
+        for post in posts:
+            if post['slug'] in existing and upsert:
+                existing_posts.append(post)
+                continue
+            if post['slug'] in taken_slugs:
+                status = self.skip_page(post)
+                counts[status] = counts.get(status, 0) + 1
+                continue
+            taken_slugs.add(post['slug'])
+            new_posts.append(post)
+        
+        with transaction.atomic():
+            for post in existing_posts:
+                status = self.update_page(existing[post['slug']], post)
+                counts[status] = counts.get(status, 0) + 1
+            
+            # Re-read the index page so path and numchild are current
+            index_page = Index.objects.get(pk=index_page.pk)
+            last_child = index_page.get_last_child()
+            step = Page._str2int(last_child.path[-Page.steplen:]) if last_child else 0
+            
+            for batch_start in range(0, len(new_posts), batch_size):
+                batch = new_posts[batch_start:batch_start + batch_size]
+                self.create_batch(index_page, batch, step + batch_start)
+                self.stdout.write(f"Inserted {batch_start + len(batch)} of {len(new_posts)} posts")
+            
+            Page.objects.filter(pk=index_page.pk).update(numchild=F('numchild') + len(new_posts))
+        
+        # The bulk inserts send no publish signals, so drop the cached listings here
+        invalidate_tag_clouds([index_page.pk])
+        bump_generation()
+        bump_search_generation()
+        purge_all()
+        
+        counts['created'] = len(new_posts)
+        elapsed = time.perf_counter() - start
+        rate = len(posts) / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Import completed: {self.format_counts(counts)} in {elapsed:.2f}s ({rate:.1f} posts/second)"
+        ))
+    
+    def create_batch(self, index_page, posts, first_step):
+        """Insert one batch of published pages below the index page."""
+        now = timezone.now()
+        depth = index_page.depth + 1
+        self.tag_cache.ensure(tag_name for post in posts for tag_name in post['tags'])
+        
+        news_pages = []
+        for offset, post in enumerate(posts, start=1):
+            news_page = NewsPage(
+                title=post['title'],
+                draft_title=post['title'],
+                slug=post['slug'],
+                date=post['date'],
+                body=post['body'],
+                path=NewsPage._get_path(index_page.path, depth, first_step + offset),
+                depth=depth,
+                numchild=0,
+                url_path=f"{index_page.url_path}{post['slug']}/",
+                locale_id=index_page.locale_id,
+                live=True,
+                has_unpublished_changes=False,
+                first_published_at=now,
+                last_published_at=now,
+                latest_revision_created_at=now,
+            )
+            # No publish signal is sent, so pre-render the body here
+            news_page.prerender()
+            # Set in memory so the revision content includes the tags
+            news_page.tagged_items = [
+                NewsPageTag(tag=tag) for tag in self.tag_cache.get(post['tags'])
+            ]
+            news_pages.append(news_page)
+        
+        # Django can't bulk_create multi-table inherited models, so insert the
+        # wagtailcore_page rows first and then the nieuws_newspage rows
+        page_fields = [field for field in Page._meta.concrete_fields if not field.primary_key]
+        base_pages = Page.objects.bulk_create([
+            Page(**{field.attname: getattr(news_page, field.attname) for field in page_fields})
+            for news_page in news_pages
+        ])
+        for news_page, base_page in zip(news_pages, base_pages):
+            news_page.id = news_page.page_ptr_id = base_page.id
+        NewsPage._base_manager._insert(news_pages, fields=NewsPage._meta.local_concrete_fields)
+        
+        tagged_items = []
+        for news_page in news_pages:
+            for tagged_item in news_page.tagged_items.all():
+                tagged_item.content_object = news_page
+                tagged_items.append(tagged_item)
+        NewsPageTag.objects.bulk_create(tagged_items)
+        TagArchiveEntry.objects.bulk_create([
+            TagArchiveEntry(tag=tagged_item.tag, page=tagged_item.content_object, date=tagged_item.content_object.date)
+            for tagged_item in tagged_items
+        ])
+        
+        content_type = ContentType.objects.get_for_model(NewsPage)
+        base_content_type = ContentType.objects.get_for_model(Page)
+        revisions = Revision.objects.bulk_create([
+            Revision(
+                content_type=content_type,
+                base_content_type=base_content_type,
+                object_id=str(news_page.id),
+                created_at=now,
+                object_str=str(news_page),
+                content=news_page.serializable_data(),
+            )
+            for news_page in news_pages
+        ])
+        
+        for news_page, revision in zip(news_pages, revisions):
+            news_page.latest_revision = news_page.live_revision = revision
+        Page.objects.bulk_update(
+            [Page(id=news_page.id, latest_revision=news_page.latest_revision, live_revision=news_page.live_revision)
+             for news_page in news_pages],
+            ['latest_revision', 'live_revision'],
+        )
         
-        return None, content
+        for backend in get_search_backends(with_auto_update=True):
+            backend.add_bulk(NewsPage, news_pages)
     
     def parse_date(self, date_str):
         """Convert string or datetime to datetime object."""
@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand
+from moosedept.cache import purge_all
+from nieuws.models import NewsPage
+
+class Command(BaseCommand):
+    help = 'Pre-render the body of every live news page again, with its plain text and word offsets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of pages updated per query')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        batch_size = options['batch_size']
+        fields = NewsPage.prerendered_fields
+        news_pages = NewsPage.objects.live().only('body', *fields).iterator(chunk_size=batch_size)
+        
+        batch = []
+        changed = 0
+        for news_page in news_pages:
+            stored = [getattr(news_page, field) for field in fields]
+            news_page.prerender()
+            if stored == [getattr(news_page, field) for field in fields]:
+                continue
+            batch.append(news_page)
+            if len(batch) == batch_size:
+                changed += NewsPage.objects.bulk_update(batch, fields)
+                batch = []
+        if batch:
+            changed += NewsPage.objects.bulk_update(batch, fields)
+        
+        if changed:
+            purge_all()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the body of {changed} pages in {elapsed:.2f}s"))
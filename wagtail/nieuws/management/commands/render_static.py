@@ -0,0 +1,132 @@
+import os
+import json
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count, Max
+from django.urls import reverse
+from wagtail.models import Page, Site
+from moosedept.conditional import page_validators
+from nieuws.hugo import write_file_atomic
+from nieuws.listing import NEWS_PER_PAGE, get_news_index
+from nieuws.models import NewsPage, TagArchiveEntry
+from nieuws.staticsite import init_worker, output_path, render_batch
+
+# Remembers what each URL was rendered from, in the output directory
+MANIFEST_NAME = '.render-manifest.json'
+
+class Command(BaseCommand):
+    help = (
+        'Render all live pages, the numbered news index pages, tag archives and feeds '
+        'to static files. Only pages whose content changed since the last run are '
+        'rendered again. Static files are not copied; run collectstatic for those.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('output_dir', type=str, help='Directory to write the site to')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Number of render processes')
+        parser.add_argument('--batch-size', type=int, default=50, help='Number of pages per render task')
+        parser.add_argument('--force', action='store_true', help='Render every page, e.g. after template changes')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        output_dir = os.path.abspath(options['output_dir'])
+        manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+
+        site = Site.objects.filter(is_default_site=True).first()
+        if not site:
+            raise CommandError("No default site")
+
+        old_manifest = {} if options['force'] else self.load_manifest(manifest_path)
+        fingerprints = self.collect_fingerprints()
+        to_render = sorted(url for url, fingerprint in fingerprints.items() if old_manifest.get(url) != fingerprint)
+        self.stdout.write(f"{len(to_render)} of {len(fingerprints)} pages to render")
+
+        manifest = {url: old_manifest[url] for url in fingerprints if url in old_manifest}
+        errors = 0
+        for url, error in self.render(to_render, output_dir, site.hostname, options['workers'], options['batch_size']):
+            if error:
+                errors += 1
+                manifest.pop(url, None)
+                self.stdout.write(self.style.ERROR(f"Error rendering {url}: {error}"))
+            else:
+                manifest[url] = fingerprints[url]
+
+        removed = 0
+        for url in set(old_manifest) - set(fingerprints):
+            try:
+                os.remove(output_path(output_dir, url))
+                removed += 1
+            except FileNotFoundError:
+                pass
+
+        os.makedirs(output_dir, exist_ok=True)
+        write_file_atomic(manifest_path, json.dumps(manifest, indent=1, sort_keys=True).encode('utf-8'))
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Render completed: {len(to_render) - errors} rendered, {len(fingerprints) - len(to_render)} unchanged, "
+            f"{removed} removed, {errors} errors in {elapsed:.2f}s"
+        ))
+
+    def load_manifest(self, manifest_path):
+        try:
+            with open(manifest_path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def collect_fingerprints(self):
+        """
+        Map every URL path of the static site to a fingerprint of its content.
+
+        Pages use their ETag, listings and feeds the ETag of the news pages
+        they list, so a URL is rendered again when its conditional GET would
+        no longer answer 304.
+        """
+        fingerprints = {}
+        for page in Page.objects.live().public().exclude(depth=1).defer_streamfields():
+            url_parts = page.get_url_parts()
+            if url_parts:
+                fingerprints[url_parts[2]] = page_validators(page)[0]
+
+        news_index = get_news_index()
+        if not news_index:
+            return fingerprints
+
+        index_etag = news_index.listing_validators()[0]
+        fingerprints[news_index.get_url_parts()[2]] = index_etag
+        news_count = NewsPage.objects.live().child_of(news_index).count()
+        for number in range(1, max(math.ceil(news_count / NEWS_PER_PAGE), 1) + 1):
+            fingerprints[reverse('paginated_news', args=[number])] = index_etag
+        fingerprints[reverse('news_feed')] = index_etag
+
+        # One grouped query versions all tag archives, like listing_validators()
+        tags = (
+            TagArchiveEntry.objects.values('tag__slug', 'tag__name')
+            .annotate(newest=Max('page__last_published_at'), count=Count('page'))
+        )
+        for tag in tags:
+            newest = tag['newest'].timestamp() if tag['newest'] else 0
+            tag_etag = f"{news_index.live_revision_id}-{tag['tag__name']}-{tag['count']}-{newest}"
+            fingerprints[reverse('tag_index', args=[tag['tag__slug']])] = tag_etag
+            fingerprints[reverse('tag_feed', args=[tag['tag__slug']])] = tag_etag
+            for number in range(1, math.ceil(tag['count'] / NEWS_PER_PAGE) + 1):
+                fingerprints[reverse('paginated_tag_index', args=[tag['tag__slug'], number])] = tag_etag
+        return fingerprints
+
+    def render(self, urls, output_dir, hostname, workers, batch_size):
+        """Render the URLs in batches over a process pool, yielding (url, error) pairs."""
+        batches = [urls[i:i + batch_size] for i in range(0, len(urls), batch_size)]
+        if workers <= 1 or len(batches) <= 1:
+            for batch in batches:
+                yield from render_batch(batch, output_dir, hostname)
+            return
+
+        # Forked workers must not inherit open database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+            for results in executor.map(render_batch, batches, [output_dir] * len(batches), [hostname] * len(batches)):
+                yield from results
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nieuws', '0003_newspagetag_newspage_tags'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+        ('wagtailcore', '0094_alter_page_locale'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='newspage',
+            index=models.Index(fields=['date', 'page_ptr'], name='nieuws_newspage_date_id'),
+        ),
+    ]
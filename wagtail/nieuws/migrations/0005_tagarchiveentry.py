@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_tag_archive(apps, schema_editor):
+    """Add the tags of the live news pages, as backfill_tag_archive does."""
+    NewsPageTag = apps.get_model('nieuws', 'NewsPageTag')
+    TagArchiveEntry = apps.get_model('nieuws', 'TagArchiveEntry')
+    tagged_items = (
+        NewsPageTag.objects.filter(content_object__live=True)
+        .values_list('tag_id', 'content_object_id', 'content_object__date')
+        .iterator(chunk_size=1000)
+    )
+    TagArchiveEntry.objects.bulk_create(
+        (TagArchiveEntry(tag_id=tag_id, page_id=page_id, date=date) for tag_id, page_id, date in tagged_items),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nieuws', '0004_newspage_date_id_index'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagArchiveEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField()),
+                ('page', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_archive_entries', to='nieuws.newspage')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='taggit.tag')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tag', 'date', 'page'], name='nieuws_tagarchive_tag_date')],
+                'constraints': [models.UniqueConstraint(fields=('tag', 'page'), name='nieuws_tagarchive_tag_page')],
+            },
+        ),
+        migrations.RunPython(fill_tag_archive, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nieuws', '0005_tagarchiveentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newspage',
+            name='body_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nieuws', '0006_newspage_body_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newspage',
+            name='body_terms',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='newspage',
+            name='body_text',
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
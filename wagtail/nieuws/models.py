@@ -1,10 +1,13 @@
 from django.db import models
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.db.models import Count, F
+from django.core.cache import cache
+from django.utils import timezone
 from taggit.models import Tag
 
 # Add these:
 from wagtail.models import Page
 from wagtail.fields import RichTextField
+from wagtail.rich_text import RichText
 from wagtail.search import index
 from wagtail.admin.panels import FieldPanel
 from modelcluster.fields import ParentalKey
@@ -13,6 +16,9 @@ from taggit.models import TaggedItemBase
 from wagtail.api import APIField
 from rest_framework import fields as api_fields
 
+from moosedept.conditional import conditional_response, listing_validators, page_validators
+from search.dutch import html_to_text, term_offsets
+
 
 class NewsPageTag(TaggedItemBase):
     content_object = ParentalKey(
@@ -26,47 +32,69 @@ class Index(Page):
     intro = RichTextField(blank=True)
 
     def get_context(self, request):
+        from .listing import first_page
+
         context = super().get_context(request)
         
-        # Get all NewsPage objects that are children of this index, sorted by date
-        newspages = NewsPage.objects.live().child_of(self).order_by('-date')
-        
-        # Filter by tag if specified in URL query params
-        tag = request.GET.get('tag')
-        if tag:
-            newspages = newspages.filter(tags__name=tag)
-        
-        # Pagination
-        page = request.GET.get('page')
-        paginator = Paginator(newspages, 50)  # Show 10 news items per page
-        try:
-            newspages = paginator.page(page)
-        except PageNotAnInteger:
-            newspages = paginator.page(1)
-        except EmptyPage:
-            newspages = paginator.page(paginator.num_pages)
-            
-        context['newspages'] = newspages
+        # News pages below this index, optionally filtered by the tag in the URL
+        context['newspages'] = first_page(self, request.GET.get('page'), request.GET.get('tag'))
         return context
         
-    def get_tags(self):
-        # Get all NewsPage objects that are descendants of this index page
-        news_pages = NewsPage.objects.descendant_of(self).live()
-        
-        # Get a list of tags with count
-        tag_dict = {}
-        for page in news_pages:
-            for tag in page.tags.all():
-                if tag.name in tag_dict:
-                    tag_dict[tag.name] += 1
-                else:
-                    tag_dict[tag.name] = 1
+    def serve(self, request, *args, **kwargs):
+        return conditional_response(
+            request,
+            self.listing_validators,
+            lambda: super(Index, self).serve(request, *args, **kwargs),
+        )
+
+    def listing_validators(self):
+        """The ETag and Last-Modified of the listings of this index."""
+        return listing_validators(NewsPage.objects.child_of(self), parent=self, changed_at=self.listing_changed_at())
+
+    def listing_changed_at(self):
+        """
+        When a news page below this index was last published, unpublished or deleted.
+
+        Kept in the cache by nieuws.signals. If the entry is gone it starts
+        again from now, which only makes clients fetch the listing once more.
+        """
+        return cache.get_or_set(self.listing_changed_key(self.id), timezone.now, None)
+
+    @staticmethod
+    def listing_changed_key(index_id):
+        return f'nieuws:index:{index_id}:changed'
         
-        # Convert to list of objects with name and count attributes
-        tags = [{'name': name, 'count': count} for name, count in tag_dict.items()]
-        tags.sort(key=lambda x: x['name'])
+    def get_tags(self):
+        """
+        Get the tags of the live news pages below this index, with counts.
+
+        Returns a list of dicts with name, slug and count, sorted by name. It
+        is a single grouped query, cached until a news page is published or
+        unpublished or a tag changes (see nieuws.signals), or for
+        NIEUWS_LISTING_CACHE_TIMEOUT at most.
+        """
+        from .listing import listing_timeout
+
+        cache_key = self.tags_cache_key(self.id)
+        tags = cache.get(cache_key)
+        if tags is None:
+            tags = list(
+                NewsPageTag.objects.filter(
+                    content_object__live=True,
+                    content_object__path__startswith=self.path,
+                    content_object__depth__gt=self.depth,
+                )
+                .values(name=F('tag__name'), slug=F('tag__slug'))
+                .annotate(count=Count('content_object'))
+                .order_by('name')
+            )
+            cache.set(cache_key, tags, listing_timeout())
         return tags
 
+    @staticmethod
+    def tags_cache_key(index_id):
+        return f'nieuws:index:{index_id}:tags'
+
     content_panels = Page.content_panels + [
         FieldPanel("intro"),
     ]
@@ -75,6 +103,13 @@ class Index(Page):
 class NewsPage(Page):
     date = models.DateTimeField("Publicatiedatum")
     body = RichTextField(blank=True)
+    # The body as the richtext filter renders it, stored when the page is
+    # published (see nieuws.signals); rebuild with the rebuild_body_html command
+    body_html = models.TextField(blank=True, editable=False)
+    # Its plain text and where each stemmed word occurs in it, stored alongside
+    # for the snippets in search results (see search.snippets)
+    body_text = models.TextField(blank=True, editable=False)
+    body_terms = models.JSONField(default=dict, blank=True, editable=False)
     tags = ClusterTaggableManager(through=NewsPageTag, blank=True)
 
     search_fields = Page.search_fields + [
@@ -85,11 +120,75 @@ class NewsPage(Page):
     api_fields = [
         APIField('date'),
         APIField('body'),
+        APIField('body_html'),
         APIField('tags'),
+        APIField('last_published_at'),
     ]
 
+    # Fields filled in by prerender()
+    prerendered_fields = ['body_html', 'body_text', 'body_terms']
+
+    def render_body(self):
+        """Expand the links and embeds in the body, like the richtext filter."""
+        return str(RichText(self.body))
+
+    def prerender(self):
+        """Fill in the rendered body, its plain text and the offsets of its words."""
+        self.body_html = self.render_body()
+        self.body_text = html_to_text(self.body_html)
+        self.body_terms = term_offsets(self.body_text)
+
+    def serve(self, request, *args, **kwargs):
+        return conditional_response(
+            request,
+            lambda: page_validators(self),
+            lambda: super(NewsPage, self).serve(request, *args, **kwargs),
+        )
+
     content_panels = Page.content_panels + [
         FieldPanel("date"), 
         FieldPanel("body"),
         FieldPanel("tags"),
-    ]
\ No newline at end of file
+    ]
+
+    class Meta:
+        indexes = [
+            # Keyset pagination seeks on (date, id)
+            models.Index(fields=['date', 'page_ptr'], name='nieuws_newspage_date_id'),
+        ]
+
+class TagArchiveEntry(models.Model):
+    """
+    One live news page under one of its tags.
+
+    A copy of NewsPageTag with the page date alongside, so a tag archive is a
+    range scan over one index instead of a join through the page tables. It
+    is kept up to date by the publish and unpublish signals in nieuws.signals;
+    run the backfill_tag_archive command to rebuild it.
+    """
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='+')
+    page = models.ForeignKey(NewsPage, on_delete=models.CASCADE, related_name='tag_archive_entries')
+    date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tag', 'page'], name='nieuws_tagarchive_tag_page'),
+        ]
+        indexes = [
+            models.Index(fields=['tag', 'date', 'page'], name='nieuws_tagarchive_tag_date'),
+        ]
+
+    @classmethod
+    def entries_for(cls, news_page):
+        return [cls(tag=tag, page=news_page, date=news_page.date) for tag in news_page.tags.all()]
+
+    @classmethod
+    def update_for(cls, news_page):
+        """Replace the entries of a page with its current tags and date."""
+        cls.objects.filter(page=news_page).delete()
+        if news_page.live:
+            cls.objects.bulk_create(cls.entries_for(news_page))
+
+    @classmethod
+    def remove_for(cls, news_page):
+        cls.objects.filter(page=news_page).delete()
@@ -0,0 +1,102 @@
+"""
+Keyset ("seek") pagination for the news archive.
+
+Pages are found by the (date, id) of the last row shown instead of by an
+offset, so every page is an index seek and no COUNT(*) is needed. Turned on
+with the NIEUWS_KEYSET_PAGINATION setting; the numbered /nieuws/page/<n>/
+URLs keep working either way.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db.models import Q
+from django.urls import reverse
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+# The largest id a database integer column holds
+MAX_ID = 2**63 - 1
+
+
+def keyset_pagination_enabled():
+    return getattr(settings, 'NIEUWS_KEYSET_PAGINATION', False)
+
+
+def encode_cursor(news_page):
+    """Encode the (date, id) of a news page as '<microseconds since epoch>.<id>'."""
+    delta = news_page.date - EPOCH
+    microseconds = (delta.days * 86400 + delta.seconds) * 10**6 + delta.microseconds
+    return f"{microseconds}.{news_page.pk}"
+
+
+def decode_cursor(cursor):
+    """Turn a cursor back into (date, id). Raises ValueError if it is malformed."""
+    microseconds, pk = cursor.split('.')
+    pk = int(pk)
+    if not 0 < pk <= MAX_ID:
+        raise ValueError(f"Id out of range: {pk}")
+    try:
+        date = EPOCH + timedelta(microseconds=int(microseconds))
+    except OverflowError as e:
+        raise ValueError(f"Date out of range: {microseconds}") from e
+    return date, pk
+
+
+class KeysetPage:
+    """
+    One page of news items, with links to the newer and older pages.
+
+    Iterates like a Paginator page, but has no page numbers or totals.
+    """
+    is_keyset = True
+
+    def __init__(self, object_list, has_newer, has_older, tag=None):
+        self.object_list = object_list
+        self.has_newer = has_newer and bool(object_list)
+        self.has_older = has_older and bool(object_list)
+        self.tag = tag
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def _url(self, direction, news_page):
+        url = reverse('keyset_news', args=[direction, encode_cursor(news_page)])
+        if self.tag:
+            url += '?' + urlencode({'tag': self.tag})
+        return url
+
+    @property
+    def newer_url(self):
+        if self.has_newer:
+            return self._url('newer', self.object_list[0])
+
+    @property
+    def older_url(self):
+        if self.has_older:
+            return self._url('older', self.object_list[-1])
+
+
+def keyset_page(queryset, per_page, direction='older', cursor=None, tag=None):
+    """
+    Get the page of news items just older or newer than the cursor.
+
+    Without a cursor this is the first (newest) page. One extra row is
+    fetched to find out whether there is another page in that direction.
+    """
+    queryset = queryset.order_by('-date', '-pk')
+
+    if cursor is None:
+        rows = list(queryset[:per_page + 1])
+        return KeysetPage(rows[:per_page], False, len(rows) > per_page, tag)
+
+    date, pk = decode_cursor(cursor)
+    if direction == 'older':
+        rows = list(queryset.filter(Q(date__lt=date) | Q(date=date, pk__lt=pk))[:per_page + 1])
+        return KeysetPage(rows[:per_page], True, len(rows) > per_page, tag)
+
+    # Walk up from the cursor in ascending order, then flip the rows back
+    rows = list(queryset.filter(Q(date__gt=date) | Q(date=date, pk__gt=pk)).reverse()[:per_page + 1])
+    return KeysetPage(rows[:per_page][::-1], len(rows) > per_page, True, tag)
@@ -0,0 +1,157 @@
+import math
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.urls import reverse
+from django.utils import timezone
+from taggit.models import Tag
+from wagtail.models import Page
+from wagtail.signals import page_published, page_slug_changed, page_unpublished, post_page_move
+
+from moosedept.cache import purge_all, purge_paths
+
+from .hugo_sync import content_dir, hugo_writer
+from .listing import NEWS_PER_PAGE, bump_generation
+from .models import Index, NewsPage, TagArchiveEntry
+from .templatetags.nieuws_tags import bump_fragment_version
+
+
+def invalidate_tag_clouds(index_ids):
+    """Drop the cached tag lists of these news indexes."""
+    cache.delete_many([Index.tags_cache_key(index_id) for index_id in index_ids])
+
+
+def mark_listings_changed(index_ids):
+    """Move the Last-Modified of the listings of these news indexes forward."""
+    now = timezone.now()
+    cache.set_many({Index.listing_changed_key(index_id): now for index_id in index_ids}, None)
+
+
+def page_path(page):
+    url_parts = page.get_url_parts()
+    return url_parts[2] if url_parts else None
+
+
+def news_page_paths(news_page, indexes):
+    """The paths that list or show a news page."""
+    # The archive entries still hold the tags from before this publish, so
+    # archives the page was just untagged from are included
+    tag_slugs = set(
+        TagArchiveEntry.objects.filter(page=news_page).values_list('tag__slug', flat=True)
+    ) | {tag.slug for tag in news_page.tags.all()}
+    # Counted before this publish too, so one more page is allowed for
+    tag_counts = dict(
+        TagArchiveEntry.objects.filter(tag__slug__in=tag_slugs)
+        .values_list('tag__slug').annotate(count=Count('id')).order_by()
+    )
+    return (
+        [page_path(news_page), reverse('paginated_news', args=[1]), reverse('news_feed')]
+        + [page_path(index_page) for index_page in indexes]
+        + [reverse('tag_index', args=[slug]) for slug in tag_slugs]
+        + [reverse('tag_feed', args=[slug]) for slug in tag_slugs]
+        + [
+            reverse('paginated_tag_index', args=[slug, number])
+            for slug in tag_slugs
+            for number in range(1, math.ceil((tag_counts.get(slug, 0) + 1) / NEWS_PER_PAGE) + 1)
+        ]
+    )
+
+
+@receiver(page_published)
+@receiver(page_unpublished)
+def page_changed(sender, instance, **kwargs):
+    paths = [page_path(instance)]
+    transaction.on_commit(lambda: purge_paths(paths))
+
+
+@receiver(page_slug_changed)
+def page_renamed(sender, instance, instance_before, **kwargs):
+    # The pages below a renamed page move along with it
+    if instance.get_children().exists():
+        purge_all()
+    else:
+        purge_paths([page_path(instance_before)])
+
+
+@receiver(post_delete)
+def page_deleted(sender, instance, **kwargs):
+    # The deleted page's URL, tags and parents are gone by now
+    if isinstance(instance, Page):
+        purge_all()
+
+
+@receiver(page_published, sender=NewsPage)
+@receiver(page_unpublished, sender=NewsPage)
+@receiver(post_delete, sender=NewsPage)
+def news_page_changed(sender, instance, **kwargs):
+    indexes = list(Index.objects.ancestor_of(instance))
+    index_ids = [index_page.id for index_page in indexes]
+    paths = [] if kwargs['signal'] is post_delete else news_page_paths(instance, indexes)
+
+    # After the receivers below have stored the body and tag archive, so a
+    # request in between can't cache the old data again
+    def invalidate():
+        invalidate_tag_clouds(index_ids)
+        mark_listings_changed(index_ids)
+        bump_generation()
+        purge_paths(paths)
+
+    transaction.on_commit(invalidate)
+
+
+@receiver(page_published, sender=NewsPage)
+def store_body_html(sender, instance, **kwargs):
+    # An update, so no new revision or page_published signal is involved
+    instance.prerender()
+    NewsPage.objects.filter(pk=instance.pk).update(
+        **{field: getattr(instance, field) for field in NewsPage.prerendered_fields}
+    )
+
+
+@receiver(page_published, sender=NewsPage)
+def update_tag_archive(sender, instance, **kwargs):
+    TagArchiveEntry.update_for(instance)
+
+
+@receiver(page_unpublished, sender=NewsPage)
+def remove_from_tag_archive(sender, instance, **kwargs):
+    # Deleted pages take their entries with them through the foreign key
+    TagArchiveEntry.remove_for(instance)
+
+
+@receiver(page_published, sender=NewsPage)
+@receiver(page_unpublished, sender=NewsPage)
+@receiver(post_delete, sender=NewsPage)
+def queue_hugo_post(sender, instance, **kwargs):
+    if content_dir():
+        page_id, slug = instance.pk, instance.slug
+        transaction.on_commit(lambda: hugo_writer.enqueue(page_id, slug))
+
+
+@receiver(page_slug_changed, sender=NewsPage)
+def queue_renamed_hugo_post(sender, instance, instance_before, **kwargs):
+    if content_dir():
+        page_id, slug = instance.pk, instance_before.slug
+        transaction.on_commit(lambda: hugo_writer.enqueue(page_id, slug))
+
+
+@receiver(page_published, sender=Index)
+@receiver(page_unpublished, sender=Index)
+@receiver(post_delete, sender=Index)
+@receiver(post_page_move)
+def index_changed(sender, **kwargs):
+    # Moving any page can move the index, or a news page out from under it
+    bump_generation()
+    purge_all()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    invalidate_tag_clouds(Index.objects.values_list('id', flat=True))
+    bump_generation()
+    bump_fragment_version()
+    purge_all()
@@ -0,0 +1,48 @@
+"""
+Render pages of the site to static files with Django's test client.
+
+Nothing that needs Django set up is imported at module level, so
+render_batch() can run in worker processes that set Django up in
+init_worker(), including spawned ones on Windows.
+"""
+import os
+
+from .hugo import write_file_atomic
+
+
+def init_worker():
+    import django
+    from django.db import connections
+
+    django.setup()
+    # Forked workers must not share the parent's database connections
+    connections.close_all()
+
+
+def output_path(output_dir, url):
+    """The file a URL path is written to: /a/b/ to a/b/index.html, /a/b.xml as is."""
+    path = url.lstrip('/')
+    if not path or path.endswith('/'):
+        path += 'index.html'
+    return os.path.join(output_dir, *path.split('/'))
+
+
+def render_batch(urls, output_dir, hostname):
+    """
+    Render URL paths and write them below the output directory.
+
+    Returns a list of (url, error) pairs; error is None for pages that were
+    written.
+    """
+    from django.test import Client
+
+    client = Client(SERVER_NAME=hostname)
+    results = []
+    for url in urls:
+        response = client.get(url)
+        if response.status_code != 200:
+            results.append((url, f"HTTP {response.status_code}"))
+            continue
+        write_file_atomic(output_path(output_dir, url), response.content)
+        results.append((url, None))
+    return results
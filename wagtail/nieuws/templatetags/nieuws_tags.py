@@ -0,0 +1,137 @@
+"""
+Versioned fragment caching for news pages.
+
+    {% load nieuws_tags %}
+    {% pagefragment "row" post %}...{% endpagefragment %}
+
+caches the enclosed markup under the page's id and its latest and live
+revisions, so it is rendered again only after the page has been saved or
+published. Tag changes bump a
+version shared by all fragments (see nieuws.signals). Hits and misses are
+counted in each process and added to counters in the cache at most every
+COUNTER_FLUSH_INTERVAL seconds and when the process exits; see the
+fragment_cache_stats command.
+"""
+import atexit
+import threading
+import time
+
+from django import template
+from django.conf import settings
+from django.core.cache import caches
+
+register = template.Library()
+
+VERSION_KEY = 'nieuws:fragment:version'
+COUNTER_KEYS = {'hits': 'nieuws:fragment:hits', 'misses': 'nieuws:fragment:misses'}
+COUNTER_FLUSH_INTERVAL = 10
+
+
+def fragment_cache():
+    return caches[getattr(settings, 'NIEUWS_FRAGMENT_CACHE', 'default')]
+
+
+def fragment_timeout():
+    return getattr(settings, 'NIEUWS_FRAGMENT_TIMEOUT', 24 * 60 * 60)
+
+
+def bump_fragment_version():
+    """Drop all cached fragments."""
+    cache = fragment_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+
+
+class FragmentCounters:
+    """Hits and misses of this process that aren't in the cache yet."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = dict.fromkeys(COUNTER_KEYS, 0)
+        self.last_flush = time.monotonic()
+
+    def count(self, counter):
+        with self.lock:
+            self.pending[counter] += 1
+            if time.monotonic() - self.last_flush < COUNTER_FLUSH_INTERVAL:
+                return
+        self.flush()
+
+    def flush(self):
+        """Add the pending counts to the counters in the cache."""
+        with self.lock:
+            pending = self.pending
+            self.pending = dict.fromkeys(COUNTER_KEYS, 0)
+            self.last_flush = time.monotonic()
+        cache = fragment_cache()
+        for counter, amount in pending.items():
+            if not amount:
+                continue
+            try:
+                cache.incr(COUNTER_KEYS[counter], amount)
+            except ValueError:
+                if not cache.add(COUNTER_KEYS[counter], amount, None):
+                    cache.incr(COUNTER_KEYS[counter], amount)
+
+    def discard(self):
+        with self.lock:
+            self.pending = dict.fromkeys(COUNTER_KEYS, 0)
+
+
+fragment_counters = FragmentCounters()
+atexit.register(fragment_counters.flush)
+
+
+def get_counters():
+    """The counters in the cache, including this process's pending counts."""
+    fragment_counters.flush()
+    counters = fragment_cache().get_many(COUNTER_KEYS.values())
+    return {counter: counters.get(key, 0) for counter, key in COUNTER_KEYS.items()}
+
+
+def reset_counters():
+    fragment_counters.discard()
+    fragment_cache().delete_many(COUNTER_KEYS.values())
+
+
+class PageFragmentNode(template.Node):
+    def __init__(self, nodelist, name, page):
+        self.nodelist = nodelist
+        self.name = name
+        self.page = page
+
+    def render(self, context):
+        # Previews show unsaved changes under the same revision ids
+        request = context.get('request')
+        if getattr(request, 'is_preview', False):
+            return self.nodelist.render(context)
+
+        page = self.page.resolve(context)
+        cache = fragment_cache()
+        # Read the version once for each template render, not once per fragment
+        if VERSION_KEY not in context.render_context:
+            context.render_context[VERSION_KEY] = cache.get(VERSION_KEY, 0)
+        version = context.render_context[VERSION_KEY]
+
+        key = f'nieuws:fragment:{version}:{self.name.resolve(context)}:{page.id}:{page.latest_revision_id}:{page.live_revision_id}'
+        markup = cache.get(key)
+        if markup is not None:
+            fragment_counters.count('hits')
+            return markup
+
+        fragment_counters.count('misses')
+        markup = self.nodelist.render(context)
+        cache.set(key, markup, fragment_timeout())
+        return markup
+
+
+@register.tag
+def pagefragment(parser, token):
+    """Cache the enclosed markup until the given page is saved or published again."""
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a fragment name and a page")
+    nodelist = parser.parse(('endpagefragment',))
+    parser.delete_first_token()
+    return PageFragmentNode(nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]))
@@ -1,3 +1,897 @@
-from django.test import TestCase
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from importlib import import_module
+from importlib.util import module_from_spec, spec_from_file_location
+from datetime import datetime, timedelta
+from io import StringIO
+from tempfile import TemporaryDirectory
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from taggit.models import Tag
+from wagtail.api.v2.views import PagesAPIViewSet
+from wagtail.models import Page, Site
+
+from moosedept.cache import purge_all
+from search.cache import search_page
+
+from .hugo import render_post
+from .hugo_sync import hugo_writer
+from .listing import NEWS_PER_PAGE, bump_generation, get_news_index, numbered_page
+from .models import Index, NewsPage, TagArchiveEntry
+from .pagination import encode_cursor, keyset_page
+from .templatetags.nieuws_tags import COUNTER_KEYS, fragment_counters, get_counters
+
+
+@override_settings(
+    STORAGES={
+        "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    },
+    CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "default"},
+        "pages": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "pages"},
+    },
+)
+class NewsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        home = Site.objects.get(is_default_site=True).root_page
+        cls.index = home.add_child(instance=Index(title="Nieuws", slug="nieuws"))
+
+    def setUp(self):
+        # Cached listings outlive the rolled back pages of earlier tests
+        for cache in caches.all():
+            cache.clear()
+        fragment_counters.discard()
+
+    def add_news_pages(self, count, tags=("huis", "dak")):
+        start = NewsPage.objects.count()
+        for number in range(start, start + count):
+            news_page = NewsPage(
+                title=f"Bericht {number}",
+                slug=f"bericht-{number}",
+                date=timezone.now() - timedelta(days=number),
+                body=f"<p>Bericht {number}</p>",
+            )
+            self.index.add_child(instance=news_page)
+            news_page.tags.add(*tags)
+            news_page.save_revision().publish()
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class NewsListingQueryTests(NewsTestCase):
+    def count_queries(self, url):
+        # The first request warms Wagtail's site and routing caches
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertConstantQueries(self, url):
+        self.add_news_pages(2)
+        few = self.count_queries(url)
+        self.add_news_pages(10)
+        many = self.count_queries(url)
+        self.assertEqual(few, many, f"{url} runs more queries as the number of posts grows")
+
+    def test_index_page(self):
+        self.assertConstantQueries("/nieuws/")
+
+    def test_index_page_filtered_by_tag(self):
+        self.assertConstantQueries("/nieuws/?tag=huis")
+
+    def test_tag_index(self):
+        self.assertConstantQueries("/tags/huis/")
+
+    def test_paginated_index(self):
+        self.assertConstantQueries("/nieuws/page/1/")
+
+
+class NewsListingTests(NewsTestCase):
+    def titles(self, page):
+        return [news_page.title for news_page in page]
+
+    def test_pages_are_cached(self):
+        self.add_news_pages(3)
+        self.assertEqual(self.titles(numbered_page(self.index, 2, per_page=2)), ["Bericht 2"])
+        # Only the page itself and its tags are fetched once the ids are cached
+        with self.assertNumQueries(2):
+            page = numbered_page(self.index, 2, per_page=2)
+            self.assertEqual(self.titles(page), ["Bericht 2"])
+        self.assertEqual(page.paginator.num_pages, 2)
+
+    @override_settings(NIEUWS_LISTING_CACHE_TIMEOUT=0)
+    def test_entries_expire(self):
+        self.add_news_pages(3)
+        numbered_page(self.index, 2, per_page=2)
+        # The count and the ids are queried again, as they have expired
+        with self.assertNumQueries(4):
+            numbered_page(self.index, 2, per_page=2)
+
+    def test_publishing_invalidates(self):
+        self.add_news_pages(3)
+        self.assertEqual(numbered_page(self.index, 1, "huis").paginator.count, 3)
+        news_page = NewsPage.objects.get(title="Bericht 1")
+        with self.captureOnCommitCallbacks(execute=True):
+            news_page.unpublish()
+        self.assertEqual(self.titles(numbered_page(self.index, 1, "huis")), ["Bericht 0", "Bericht 2"])
+
+    def test_index_is_resolved_once(self):
+        self.assertEqual(get_news_index(), self.index)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_news_index(), self.index)
+
+
+class TagArchiveTests(NewsTestCase):
+    def archive(self, tag):
+        return list(
+            TagArchiveEntry.objects.filter(tag__name=tag).order_by('-date').values_list('page__title', flat=True)
+        )
+
+    def test_follows_publishing(self):
+        self.add_news_pages(2)
+        self.assertEqual(self.archive("huis"), ["Bericht 0", "Bericht 1"])
+
+        news_page = NewsPage.objects.get(title="Bericht 0")
+        news_page.tags.set(["dak"])
+        news_page.save_revision().publish()
+        self.assertEqual(self.archive("huis"), ["Bericht 1"])
+        self.assertEqual(self.archive("dak"), ["Bericht 0", "Bericht 1"])
+
+        news_page.unpublish()
+        self.assertEqual(self.archive("dak"), ["Bericht 1"])
+
+    def test_backfill(self):
+        self.add_news_pages(3)
+        TagArchiveEntry.objects.all().delete()
+        call_command("backfill_tag_archive", stdout=StringIO())
+        self.assertEqual(self.archive("dak"), ["Bericht 0", "Bericht 1", "Bericht 2"])
+        self.assertContains(self.client.get("/tags/dak/"), "Bericht 2")
+
+    def test_filled_by_migration(self):
+        self.add_news_pages(2)
+        NewsPage.objects.get(title="Bericht 1").unpublish()
+        TagArchiveEntry.objects.all().delete()
+        migration = import_module("nieuws.migrations.0005_tagarchiveentry")
+        migration.fill_tag_archive(apps, None)
+        self.assertEqual(self.archive("dak"), ["Bericht 0"])
+        self.assertEqual(self.archive("huis"), ["Bericht 0"])
+
+
+class TagCloudTests(NewsTestCase):
+    def tags(self):
+        return [(tag["name"], tag["count"]) for tag in Index.objects.get(pk=self.index.pk).get_tags()]
+
+    def test_counts(self):
+        self.add_news_pages(2)
+        self.add_news_pages(1, tags=("tuin", "huis"))
+        draft = NewsPage(title="Klad", slug="klad", date=timezone.now(), live=False)
+        self.index.add_child(instance=draft)
+        draft.tags.add("kelder")
+        draft.save_revision()
+        self.assertEqual(self.tags(), [("dak", 2), ("huis", 3), ("tuin", 1)])
+        self.assertEqual(self.index.get_tags()[0]["slug"], "dak")
+
+        with self.assertNumQueries(0):
+            self.index.get_tags()
+
+    def test_follows_changes(self):
+        self.add_news_pages(2)
+        self.assertEqual(self.tags(), [("dak", 2), ("huis", 2)])
+
+        news_page = NewsPage.objects.get(title="Bericht 0")
+        news_page.tags.set(["dak", "tuin"])
+        with self.captureOnCommitCallbacks(execute=True):
+            news_page.save_revision().publish()
+        self.assertEqual(self.tags(), [("dak", 2), ("huis", 1), ("tuin", 1)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            news_page.unpublish()
+        self.assertEqual(self.tags(), [("dak", 1), ("huis", 1)])
+
+        tag = Tag.objects.get(name="dak")
+        tag.name = "zolder"
+        tag.save()
+        self.assertEqual(self.tags(), [("huis", 1), ("zolder", 1)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            news_page.save_revision().publish()
+        self.assertEqual(self.tags(), [("huis", 1), ("tuin", 1), ("zolder", 2)])
+
+    @override_settings(NIEUWS_LISTING_CACHE_TIMEOUT=0)
+    def test_entries_expire(self):
+        self.add_news_pages(1)
+        self.assertEqual(self.tags(), [("dak", 1), ("huis", 1)])
+        # Changed without signals, as another process or a raw update might
+        NewsPage.objects.update(live=False)
+        self.assertEqual(self.tags(), [])
+
+
+class PageCacheTests(NewsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_news_pages(2)
+
+    def assertCached(self, url, hit=True):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Page-Cache"], "hit" if hit else "miss")
+        return response
+
+    def test_hit_after_miss(self):
+        for url in ["/nieuws/", "/nieuws/?tag=huis", "/nieuws/bericht-0/", "/tags/huis/"]:
+            self.assertCached(url, hit=False)
+            self.assertCached(url)
+
+    def test_bypass(self):
+        self.client.get("/search/?query=bericht")
+        self.assertNotIn("X-Page-Cache", self.client.get("/search/?query=bericht"))
+
+        self.client.force_login(get_user_model().objects.create_superuser("editor", password="x"))
+        self.client.get("/nieuws/")
+        self.assertNotIn("X-Page-Cache", self.client.get("/nieuws/"))
+
+    def test_publish_purges(self):
+        urls = [
+            "/nieuws/", "/nieuws/?page=1", "/nieuws/page/1/", "/tags/huis/", "/tags/huis/page/1/", "/tags/dak/",
+            "/nieuws/bericht-0/",
+        ]
+        for url in urls + ["/nieuws/bericht-1/"]:
+            self.client.get(url)
+
+        news_page = NewsPage.objects.get(title="Bericht 0")
+        news_page.title = "Gewijzigd bericht"
+        news_page.tags.set(["huis"])
+        with self.captureOnCommitCallbacks(execute=True):
+            news_page.save_revision().publish()
+
+        for url in urls:
+            self.assertCached(url, hit=False)
+        self.assertContains(self.client.get("/tags/huis/"), "Gewijzigd bericht")
+        self.assertNotContains(self.client.get("/tags/dak/"), "Gewijzigd bericht")
+        self.assertCached("/nieuws/bericht-1/")
+
+    def test_purged_after_archive_update(self):
+        update_for = TagArchiveEntry.update_for
+
+        def request_then_update(news_page):
+            # A request made while the page is being published
+            self.client.get("/tags/tuin/")
+            update_for(news_page)
+
+        news_page = NewsPage.objects.get(title="Bericht 0")
+        news_page.tags.set(["tuin"])
+        with mock.patch.object(TagArchiveEntry, "update_for", side_effect=request_then_update):
+            with self.captureOnCommitCallbacks(execute=True):
+                news_page.save_revision().publish()
+        self.assertContains(self.client.get("/tags/tuin/"), "Bericht 0")
+
+    def test_rename_purges_old_path(self):
+        self.assertCached("/nieuws/bericht-0/", hit=False)
+        news_page = NewsPage.objects.get(title="Bericht 0")
+        news_page.slug = "nieuwe-naam"
+        with self.captureOnCommitCallbacks(execute=True):
+            news_page.save_revision().publish()
+        self.assertRedirects(self.client.get("/nieuws/bericht-0/"), "/nieuws/nieuwe-naam/", 301)
+
+
+class SharedCacheTests(NewsTestCase):
+    """Changes made by another server process or a management command."""
+    def setUp(self):
+        directory = self.enterContext(TemporaryDirectory())
+        self.enterContext(override_settings(CACHES={
+            alias: {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": os.path.join(directory, alias),
+            }
+            for alias in ("default", "pages")
+        }))
+        super().setUp()
+        self.add_news_pages(2)
+
+    def test_default_cache_is_shared(self):
+        from moosedept.settings import base
+
+        self.assertNotIn("locmem", base.CACHES["default"]["BACKEND"])
+
+    def test_generation_bumped_elsewhere(self):
+        self.assertContains(self.client.get("/nieuws/"), "Bericht 0")
+        self.assertEqual(numbered_page(self.index, 1).paginator.count, 2)
+
+        # Like import_from_hugo --bulk: rows written without signals, then the
+        # caches invalidated through their own cache connections
+        NewsPage.objects.filter(title="Bericht 0").update(live=False)
+        with mock.patch("nieuws.listing.cache", caches.create_connection("default")), \
+                mock.patch("moosedept.cache.page_cache", lambda: caches.create_connection("pages")):
+            bump_generation()
+            purge_all()
+
+        self.assertEqual([news_page.title for news_page in numbered_page(self.index, 1)], ["Bericht 1"])
+        response = self.client.get("/nieuws/")
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertNotContains(response, "Bericht 0")
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class ConditionalGetTests(NewsTestCase):
+    urls = ["/nieuws/", "/nieuws/bericht-0/", "/tags/huis/", "/nieuws/page/1/", "/api/v2/pages/"]
+
+    def setUp(self):
+        super().setUp()
+        self.add_news_pages(2)
+
+    def assertNotModified(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header("Last-Modified"))
+        response = self.client.get(url, headers={"If-None-Match": response["ETag"]})
+        self.assertEqual(response.status_code, 304)
+
+    def test_not_modified(self):
+        for url in self.urls + [f"/api/v2/pages/{NewsPage.objects.first().id}/"]:
+            with self.subTest(url=url):
+                self.assertNotModified(url)
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get("/nieuws/bericht-0/")["Last-Modified"]
+        response = self.client.get("/nieuws/bericht-0/", headers={"If-Modified-Since": last_modified})
+        self.assertEqual(response.status_code, 304)
+
+    def test_unpublish_changes_last_modified(self):
+        urls = ["/nieuws/", "/tags/huis/", "/nieuws/page/1/"]
+        last_modified = {url: self.client.get(url)["Last-Modified"] for url in urls}
+        # The last published page goes, so the newest publish time moves backwards
+        later = timezone.now() + timedelta(minutes=1)
+        with mock.patch("django.utils.timezone.now", return_value=later), self.captureOnCommitCallbacks(execute=True):
+            NewsPage.objects.get(title="Bericht 1").unpublish()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url, headers={"If-Modified-Since": last_modified[url]})
+                self.assertEqual(response.status_code, 200)
+                self.assertNotContains(response, "Bericht 1<")
+
+    def test_publish_changes_etags(self):
+        etags = {url: self.client.get(url)["ETag"] for url in self.urls}
+        NewsPage.objects.get(title="Bericht 0").save_revision().publish()
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url, headers={"If-None-Match": etags[url]})
+                self.assertEqual(response.status_code, 200)
+
+    def test_tag_rename_changes_etags(self):
+        urls = self.urls + [f"/api/v2/pages/{NewsPage.objects.first().id}/"]
+        etags = {url: self.client.get(url)["ETag"] for url in urls}
+        tag = Tag.objects.get(name="dak")
+        tag.name = "zolder"
+        tag.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url, headers={"If-None-Match": etags[url]})
+                self.assertEqual(response.status_code, 200)
+
+    def test_api_detail_fetches_page_once(self):
+        url = f"/api/v2/pages/{NewsPage.objects.first().id}/"
+        with mock.patch.object(
+            PagesAPIViewSet, "get_object", autospec=True, side_effect=PagesAPIViewSet.get_object
+        ) as get_object:
+            response = self.client.get(url)
+        self.assertEqual(response.json()["title"], NewsPage.objects.first().title)
+        get_object.assert_called_once()
+
+    @override_settings(PAGE_CACHE_TIMEOUT=60)
+    def test_page_cache_hit(self):
+        self.client.get("/nieuws/")
+        response = self.client.get("/nieuws/")
+        self.assertEqual(response["X-Page-Cache"], "hit")
+        response = self.client.get("/nieuws/", headers={"If-None-Match": response["ETag"]})
+        self.assertEqual(response.status_code, 304)
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class FragmentCacheTests(NewsTestCase):
+    def test_rows_are_reused(self):
+        self.add_news_pages(3)
+        self.client.get("/nieuws/")
+        self.assertEqual(get_counters(), {"hits": 0, "misses": 3})
+        self.client.get("/tags/huis/")
+        self.assertEqual(get_counters(), {"hits": 3, "misses": 3})
+
+        news_page = NewsPage.objects.get(title="Bericht 1")
+        news_page.title = "Gewijzigd bericht"
+        news_page.save_revision().publish()
+        self.assertContains(self.client.get("/nieuws/"), "Gewijzigd bericht")
+        self.assertEqual(get_counters(), {"hits": 5, "misses": 4})
+
+    def test_tag_rename(self):
+        self.add_news_pages(1)
+        self.client.get("/nieuws/bericht-0/")
+        tag = Tag.objects.get(name="dak")
+        tag.name = "zolder"
+        tag.save()
+        self.assertContains(self.client.get("/nieuws/bericht-0/"), "zolder")
+
+    def test_stats_command(self):
+        self.add_news_pages(1)
+        self.client.get("/nieuws/bericht-0/")
+        self.client.get("/nieuws/bericht-0/")
+        stdout = StringIO()
+        call_command("fragment_cache_stats", "--reset", stdout=stdout)
+        self.assertIn("Hit ratio: 50.0%", stdout.getvalue())
+        self.assertEqual(get_counters(), {"hits": 0, "misses": 0})
+
+    def test_counters_flushed_periodically(self):
+        self.add_news_pages(3)
+        cache = caches["default"]
+        self.client.get("/nieuws/")
+        self.assertIsNone(cache.get(COUNTER_KEYS["misses"]))
+
+        with mock.patch("nieuws.templatetags.nieuws_tags.COUNTER_FLUSH_INTERVAL", 0):
+            self.client.get("/nieuws/")
+        self.assertEqual(cache.get_many(COUNTER_KEYS.values()), {COUNTER_KEYS["hits"]: 3, COUNTER_KEYS["misses"]: 3})
+
+
+class BodyHtmlTests(NewsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_news_pages(1)
+        self.news_page = NewsPage.objects.get()
+        self.news_page.body = f'<p><a linktype="page" id="{self.index.id}">Meer nieuws</a></p>'
+        self.news_page.save_revision().publish()
+
+    def test_stored_on_publish(self):
+        self.news_page.refresh_from_db()
+        self.assertIn('<a href="/nieuws/">Meer nieuws</a>', self.news_page.body_html)
+
+        response = self.client.get(f"/api/v2/pages/{self.news_page.id}/")
+        self.assertEqual(response.json()["body_html"], self.news_page.body_html)
+
+    def test_template_uses_stored_html(self):
+        NewsPage.objects.update(body_html="<p>Voorgerenderd</p>")
+        self.assertContains(self.client.get("/nieuws/bericht-0/"), "Voorgerenderd")
+
+    def test_rebuild(self):
+        NewsPage.objects.update(body_html="")
+        call_command("rebuild_body_html", stdout=StringIO())
+        self.assertContains(self.client.get("/nieuws/bericht-0/"), '<a href="/nieuws/">Meer nieuws</a>')
+        self.assertIn("/nieuws/", NewsPage.objects.get().body_html)
+
+
+class FeedTests(NewsTestCase):
+    def test_feeds(self):
+        self.add_news_pages(2, tags=("huis",))
+        response = self.client.get("/nieuws/index.xml")
+        self.assertContains(response, "<title>Bericht 0</title>")
+        self.assertContains(self.client.get("/tags/huis/index.xml"), "<title>Bericht 1</title>")
+        self.assertEqual(self.client.get("/tags/dak/index.xml").status_code, 404)
+
+
+class NewsExportTests(NewsTestCase):
+    def export(self):
+        response = self.client.get("/api/v2/news/export/")
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson; charset=utf-8")
+        return [json.loads(line) for line in b"".join(response.streaming_content).decode("utf-8").splitlines()]
+
+    @mock.patch("moosedept.api.EXPORT_CHUNK_SIZE", 2)
+    def test_export(self):
+        self.add_news_pages(3)
+        news_page = NewsPage.objects.get(title="Bericht 1")
+        news_page.tags.set(["zolder", "dak"])
+        news_page.save_revision().publish()
+        # Same date as Bericht 1, and live without ever being published
+        unpublished = NewsPage(title="Geïmporteerd", slug="geimporteerd", date=news_page.date, body="<p>Oud</p>")
+        self.index.add_child(instance=unpublished)
+        hidden = NewsPage(title="Verborgen", slug="verborgen", date=timezone.now(), live=False)
+        self.index.add_child(instance=hidden)
+
+        rows = self.export()
+        self.assertEqual(
+            [(row["title"], row["tags"]) for row in rows],
+            [
+                ("Bericht 0", ["dak", "huis"]),
+                ("Geïmporteerd", []),
+                ("Bericht 1", ["dak", "zolder"]),
+                ("Bericht 2", ["dak", "huis"]),
+            ],
+        )
+        self.assertIsNone(rows[1]["last_published_at"])
+        self.assertEqual(rows[1]["body_html"], "<p>Oud</p>")
+        api_page = self.client.get(f"/api/v2/pages/{news_page.pk}/", {"fields": "date,last_published_at"}).json()
+        self.assertEqual(rows[2]["date"], api_page["date"])
+        self.assertEqual(rows[2]["last_published_at"], api_page["last_published_at"])
+
+        # The manifest getnews.py --incremental starts from
+        manifest = self.client.get("/api/v2/news/manifest/").json()["pages"]
+        self.assertEqual(len(manifest), 4)
+        self.assertEqual(manifest[str(news_page.pk)], {"slug": "bericht-1", "last_published_at": api_page["last_published_at"]})
+        self.assertEqual(manifest[str(unpublished.pk)], {"slug": "geimporteerd", "last_published_at": None})
+
+
+class GetNewsTests(NewsTestCase):
+    """getnews.py --incremental against the manifest and pages of the API."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        spec = spec_from_file_location("getnews", os.path.join(os.path.dirname(settings.BASE_DIR), "getnews.py"))
+        cls.getnews = module_from_spec(spec)
+        spec.loader.exec_module(cls.getnews)
+
+    def setUp(self):
+        super().setUp()
+        self.output_dir = self.enterContext(TemporaryDirectory())
+        self.enterContext(mock.patch.multiple(
+            self.getnews,
+            OUTPUT_DIR=self.output_dir,
+            STATE_FILE=os.path.join(self.output_dir, "state.json"),
+            get_page_manifest=lambda: self.client.get("/api/v2/news/manifest/").json()["pages"],
+            get_news_page=lambda page_id: self.api_pages[page_id],
+            RENDER_WORKERS=1,
+        ))
+        self.add_news_pages(3)
+        self.sync()
+
+    def sync(self):
+        # The fetches run in threads, which can't see the test's transaction
+        self.api_pages = {
+            str(page_id): self.client.get(f"/api/v2/pages/{page_id}/", {"fields": self.getnews.PAGE_FIELDS}).json()
+            for page_id in NewsPage.objects.values_list("id", flat=True)
+        }
+        with redirect_stdout(StringIO()) as stdout:
+            self.getnews.export_incremental()
+        return stdout.getvalue()
+
+    def plan(self):
+        known_pages = self.getnews.load_state()["pages"]
+        manifest = self.client.get("/api/v2/news/manifest/").json()["pages"]
+        return self.getnews.plan_sync(known_pages, manifest)
+
+    def page_id(self, title):
+        return str(NewsPage.objects.get(title=title).pk)
+
+    def test_unchanged(self):
+        self.assertEqual(self.plan(), ([], []))
+        self.assertIn("0 pages changed, 0 removed", self.sync())
+
+    def test_new_page(self):
+        self.add_news_pages(1)
+        self.assertEqual(self.plan(), ([self.page_id("Bericht 3")], []))
+        self.sync()
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, "bericht-3.md")))
+
+    def test_changed_page(self):
+        news_page = NewsPage.objects.get(title="Bericht 1")
+        news_page.title = "Gewijzigd bericht"
+        news_page.save_revision().publish()
+        self.assertEqual(self.plan(), ([str(news_page.pk)], []))
+        self.sync()
+        with open(os.path.join(self.output_dir, "bericht-1.md"), encoding="utf-8") as f:
+            self.assertIn("title: Gewijzigd bericht", f.read())
+
+    def test_removed_page(self):
+        news_page = NewsPage.objects.get(title="Bericht 1")
+        news_page.unpublish()
+        self.assertEqual(self.plan(), ([], [str(news_page.pk)]))
+        self.sync()
+        self.assertEqual(sorted(os.listdir(self.output_dir)), ["bericht-0.md", "bericht-2.md", "state.json"])
+
+    def test_renamed_page(self):
+        news_page = NewsPage.objects.get(title="Bericht 1")
+        news_page.slug = "nieuwe-naam"
+        news_page.save_revision().publish()
+        self.assertEqual(self.plan(), ([str(news_page.pk)], []))
+        self.sync()
+        self.assertEqual(
+            sorted(os.listdir(self.output_dir)), ["bericht-0.md", "bericht-2.md", "nieuwe-naam.md", "state.json"]
+        )
+
+    def test_missing_file(self):
+        os.remove(os.path.join(self.output_dir, "bericht-2.md"))
+        self.assertEqual(self.plan(), ([self.page_id("Bericht 2")], []))
+
+
+class RenderStaticTests(NewsTestCase):
+    def render(self, *args):
+        stdout = StringIO()
+        call_command("render_static", self.output_dir, "--workers", "1", *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def setUp(self):
+        super().setUp()
+        self.output_dir = self.enterContext(TemporaryDirectory())
+        self.add_news_pages(3, tags=("huis",))
+
+    def read(self, *path):
+        with open(os.path.join(self.output_dir, *path), encoding="utf-8") as f:
+            return f.read()
+
+    def test_render(self):
+        self.assertIn("0 errors", self.render())
+        self.assertIn("Bericht 2", self.read("nieuws", "index.html"))
+        self.assertIn("Bericht 0", self.read("nieuws", "bericht-0", "index.html"))
+        self.assertIn("Bericht 1", self.read("nieuws", "page", "1", "index.html"))
+        self.assertIn("Bericht 1", self.read("tags", "huis", "index.html"))
+        self.assertIn("Bericht 1", self.read("tags", "huis", "page", "1", "index.html"))
+        self.assertIn("<rss", self.read("nieuws", "index.xml"))
+
+    def test_tag_archive_pages(self):
+        # Added without publishing, which is too slow for this many pages
+        for number in range(3, NEWS_PER_PAGE + 3):
+            news_page = NewsPage(title=f"Bericht {number}", date=timezone.now() - timedelta(days=number))
+            self.index.add_child(instance=news_page)
+            news_page.tags.add("huis")
+            TagArchiveEntry.update_for(news_page)
+        self.render()
+        first_page = self.read("tags", "huis", "index.html")
+        self.assertIn('href="/tags/huis/page/2/"', first_page)
+        self.assertNotIn("?tag=", first_page)
+        last_page = self.read("tags", "huis", "page", "2", "index.html")
+        self.assertIn(f"Bericht {NEWS_PER_PAGE + 2}<", last_page)
+        self.assertIn('href="/tags/huis/page/1/"', last_page)
+
+    def test_incremental(self):
+        self.render()
+        self.assertIn("0 of ", self.render())
+
+        news_page = NewsPage.objects.get(title="Bericht 1")
+        news_page.title = "Gewijzigd bericht"
+        with self.captureOnCommitCallbacks(execute=True):
+            news_page.save_revision().publish()
+        output = self.render()
+        # The page itself, the index, its first numbered page, the feed and the
+        # tag archive, its first numbered page and feed
+        self.assertIn("7 rendered", output)
+        self.assertIn("Gewijzigd bericht", self.read("tags", "huis", "index.html"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            news_page.unpublish()
+        self.assertIn("1 removed", self.render())
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, "nieuws", "bericht-1", "index.html")))
+
+
+class ImportFromHugoTests(NewsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content_dir = self.enterContext(TemporaryDirectory())
+        os.mkdir(os.path.join(self.content_dir, "nieuws"))
+
+    def write_post(self, slug, title, tags=(), body="<p>Tekst</p>", day=1):
+        with open(os.path.join(self.content_dir, "nieuws", f"{slug}.md"), "w", encoding="utf-8") as f:
+            f.write(render_post(title, datetime(2024, 1, day, 12), tags, body))
+
+    def import_posts(self, *args):
+        stdout = StringIO()
+        call_command("import_from_hugo", self.content_dir, "--workers", "1", *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def assertImported(self, posts):
+        """Check the tree and the published revision of {slug: (title, tags)}."""
+        self.assertEqual(Page.find_problems(), ([], [], [], [], []))
+        self.index.refresh_from_db()
+        self.assertEqual(self.index.numchild, NewsPage.objects.count())
+        for slug, (title, tags) in posts.items():
+            with self.subTest(slug=slug):
+                news_page = NewsPage.objects.get(slug=slug)
+                self.assertEqual(news_page.get_parent().pk, self.index.pk)
+                self.assertEqual(news_page.depth, self.index.depth + 1)
+                self.assertEqual(news_page.url, f"/nieuws/{slug}/")
+                self.assertTrue(news_page.live)
+                self.assertEqual(sorted(news_page.tags.names()), sorted(tags))
+                self.assertEqual(
+                    sorted(TagArchiveEntry.objects.filter(page=news_page).values_list("tag__name", flat=True)),
+                    sorted(tags),
+                )
+                revision = news_page.live_revision.as_object()
+                self.assertEqual(revision.title, title)
+                self.assertEqual(sorted(tag.name for tag in revision.tags.all()), sorted(tags))
+
+    def test_bulk(self):
+        # Bulk inserted pages go after the existing children of the index
+        self.add_news_pages(1, tags=("huis",))
+        self.write_post("tuin", "Tuin", ["tuin", "huis"])
+        self.write_post("dak", "Dak", ["dak"], day=2)
+        self.write_post("gevel", "Gevel", day=3)
+        self.write_post("bericht-0", "Bestaat al")
+        self.assertEqual(search_page("gevel", 1).paginator.count, 0)
+        output = self.import_posts("--bulk", "--batch-size", "2")
+        self.assertIn("Import completed: 3 created, 0 updated, 0 unchanged, 1 skipped", output)
+        self.assertImported({
+            "bericht-0": ("Bericht 0", ["huis"]),
+            "tuin": ("Tuin", ["tuin", "huis"]),
+            "dak": ("Dak", ["dak"]),
+            "gevel": ("Gevel", []),
+        })
+        self.assertContains(self.client.get("/nieuws/dak/"), "Tekst")
+        self.assertEqual(search_page("gevel", 1).paginator.count, 1)
+
+    def test_workers(self):
+        for day in range(1, 9):
+            self.write_post(f"bericht-{day}", f"Bericht {day}", ["huis"], body=f"**Dag {day}**", day=day)
+        self.write_post("kapot", "Kapot")
+        with open(os.path.join(self.content_dir, "nieuws", "kapot.md"), "wb") as f:
+            f.write(b"\xff\xfe")
+        pool = self.enterContext(mock.patch(
+            "nieuws.management.commands.import_from_hugo.ProcessPoolExecutor", wraps=ProcessPoolExecutor
+        ))
+        for args in ([], ["--bulk"]):
+            with self.subTest(args=args):
+                NewsPage.objects.all().delete()
+                output = self.import_posts("--workers", "3", *args)
+                pool.assert_called_with(max_workers=3)
+                self.assertIn("8 created", output)
+                self.assertIn("kapot.md", output)
+                self.assertImported({f"bericht-{day}": (f"Bericht {day}", ["huis"]) for day in range(1, 9)})
+                self.assertEqual(NewsPage.objects.get(slug="bericht-3").body, "<p><strong>Dag 3</strong></p>")
+
+    def test_upsert(self):
+        self.write_post("tuin", "Tuin", ["tuin"])
+        self.write_post("dak", "Dak", ["dak"])
+        self.write_post("gevel", "Gevel", ["huis", "gevel"])
+        self.import_posts()
+        revisions = {news_page.slug: news_page.live_revision_id for news_page in NewsPage.objects.all()}
+
+        self.write_post("tuin", "Tuin", ["tuin", "huis"])
+        self.write_post("dak", "Nieuw dak", ["dak"])
+        self.write_post("schuur", "Schuur")
+        # Without --upsert existing pages are left alone, changed or not
+        self.assertIn("1 created, 0 updated, 0 unchanged, 3 skipped", self.import_posts())
+        self.assertEqual(NewsPage.objects.get(slug="dak").title, "Dak")
+        self.assertIn("0 created, 2 updated, 2 unchanged, 0 skipped", self.import_posts("--upsert"))
+        self.assertImported({
+            "tuin": ("Tuin", ["tuin", "huis"]),
+            "dak": ("Nieuw dak", ["dak"]),
+            "gevel": ("Gevel", ["huis", "gevel"]),
+            "schuur": ("Schuur", []),
+        })
+        self.assertEqual(NewsPage.objects.get(slug="gevel").live_revision_id, revisions["gevel"])
+        self.assertNotEqual(NewsPage.objects.get(slug="dak").live_revision_id, revisions["dak"])
+
+        for args in (["--upsert"], ["--upsert", "--bulk"]):
+            with self.subTest(args=args):
+                self.assertIn("0 created, 0 updated, 4 unchanged, 0 skipped", self.import_posts(*args))
+
+    def test_tag_slugs(self):
+        Tag.objects.create(name="Huis-tuin")
+        names = ["Huis tuin", "huis tuin", "Café", "Dak!", "dak"]
+
+        # The slugs taggit gives these tags when they are saved one by one
+        with transaction.atomic():
+            expected = {name: Tag.objects.create(name=name).slug for name in names}
+            transaction.set_rollback(True)
+
+        self.write_post("tuin", "Tuin", names)
+        self.import_posts("--bulk")
+        self.assertEqual(dict(Tag.objects.filter(name__in=names).values_list("name", "slug")), expected)
+        self.assertContains(self.client.get(f"/tags/{expected['huis tuin']}/"), "Tuin")
+
+
+@override_settings(NIEUWS_HUGO_DEBOUNCE=60)
+class HugoSyncTests(NewsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content_dir = self.enterContext(TemporaryDirectory())
+        self.enterContext(override_settings(NIEUWS_HUGO_CONTENT_DIR=self.content_dir))
+
+    def publish(self, news_page):
+        with self.captureOnCommitCallbacks(execute=True):
+            news_page.save_revision().publish()
+        return hugo_writer.flush()
+
+    def read(self, slug):
+        with open(os.path.join(self.content_dir, f"{slug}.md"), encoding="utf-8") as f:
+            return f.read()
+
+    def test_publish_writes_post(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_news_pages(2)
+        self.assertEqual(hugo_writer.flush(), 2)
+        post = self.read("bericht-0")
+        self.assertTrue(post.startswith("---\ndate: "))
+        self.assertIn("draft: false\ntags:\n- dak\n- huis\ntitle: Bericht 0\n---\n\nBericht 0", post)
+
+        # Republishing without changes leaves the file alone
+        self.assertEqual(self.publish(NewsPage.objects.get(slug="bericht-0")), 0)
+
+    def test_slug_change_and_unpublish(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_news_pages(1)
+        hugo_writer.flush()
+
+        news_page = NewsPage.objects.get()
+        news_page.slug = "nieuwe-naam"
+        self.publish(news_page)
+        self.assertEqual(sorted(os.listdir(self.content_dir)), ["nieuwe-naam.md"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            news_page.unpublish()
+        self.assertEqual(hugo_writer.flush(), 1)
+        self.assertEqual(os.listdir(self.content_dir), [])
+
+    def test_failed_batch_is_queued_again(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_news_pages(1)
+        with mock.patch("nieuws.hugo_sync.write_post", side_effect=OSError("Schijf vol")):
+            with self.assertRaises(OSError):
+                hugo_writer.flush()
+        self.assertEqual(os.listdir(self.content_dir), [])
+        self.assertEqual(hugo_writer.flush(), 1)
+        self.assertEqual(os.listdir(self.content_dir), ["bericht-0.md"])
+
+    def test_writer_thread_survives_errors(self):
+        self.addCleanup(setattr, hugo_writer, "thread", hugo_writer.thread)
+        hugo_writer.pending = {1: {"bericht-0"}}
+        hugo_writer.last_queued = 0
+        flush = self.enterContext(mock.patch.object(hugo_writer, "flush", side_effect=[OSError("Schijf vol"), SystemExit]))
+        self.enterContext(mock.patch("nieuws.hugo_sync.RETRY_DELAY", 0))
+        self.enterContext(mock.patch("nieuws.hugo_sync.connection"))
+        hugo_writer.thread = "running"
+        with self.assertLogs("nieuws.hugo_sync", "ERROR"), self.assertRaises(SystemExit):
+            hugo_writer.run()
+        self.assertEqual(flush.call_count, 2)
+        self.assertIsNone(hugo_writer.thread)
+        hugo_writer.pending = {}
+
+
+class KeysetPaginationTests(NewsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_news_pages(5)
+        self.newspages = NewsPage.objects.live().child_of(self.index)
+
+    def titles(self, page):
+        return [news_page.title for news_page in page]
+
+    def test_walk_older_and_back(self):
+        first = keyset_page(self.newspages, 2)
+        self.assertEqual(self.titles(first), ["Bericht 0", "Bericht 1"])
+        self.assertFalse(first.has_newer)
+
+        second = keyset_page(self.newspages, 2, 'older', encode_cursor(first.object_list[-1]))
+        self.assertEqual(self.titles(second), ["Bericht 2", "Bericht 3"])
+
+        last = keyset_page(self.newspages, 2, 'older', encode_cursor(second.object_list[-1]))
+        self.assertEqual(self.titles(last), ["Bericht 4"])
+        self.assertFalse(last.has_older)
+
+        back = keyset_page(self.newspages, 2, 'newer', encode_cursor(last.object_list[0]))
+        self.assertEqual(self.titles(back), ["Bericht 2", "Bericht 3"])
+        self.assertTrue(back.has_newer)
+
+    def test_same_date_is_ordered_by_id(self):
+        NewsPage.objects.update(date=timezone.now())
+        seen = []
+        page = keyset_page(self.newspages, 2)
+        while True:
+            seen += self.titles(page)
+            if not page.has_older:
+                break
+            page = keyset_page(self.newspages, 2, 'older', encode_cursor(page.object_list[-1]))
+        self.assertEqual(sorted(seen), sorted(self.newspages.values_list('title', flat=True)))
+        self.assertEqual(len(seen), 5)
+
+    @override_settings(NIEUWS_KEYSET_PAGINATION=True)
+    def test_views(self):
+        response = self.client.get("/nieuws/")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "Nieuwer")
+
+        cursor = encode_cursor(self.newspages.order_by('-date').first())
+        response = self.client.get(f"/nieuws/page/older/{cursor}/")
+        self.assertContains(response, "Bericht 1")
+        self.assertNotContains(response, "Bericht 0<")
+
+        for cursor in ("123.abc", "99999999999999999999999.1", "300000000000000000.1", "1.99999999999999999999"):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(f"/nieuws/page/older/{cursor}/")
+                self.assertEqual(response.status_code, 404)
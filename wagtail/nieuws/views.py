@@ -1,15 +1,18 @@
 from django.shortcuts import render, get_object_or_404
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from wagtail.models import Page
-from .models import Index, NewsPage
+from django.http import Http404
+from moosedept.conditional import conditional_response
+from .listing import cursor_page, first_page, get_news_index, numbered_page
 from taggit.models import Tag
 
-def tag_index(request, tag):
+def tag_index(request, tag, page_number=None):
     """
     View function for displaying news items filtered by tag
+
+    Further pages have a path of their own, so a static copy of the site
+    can have them too.
     """
     # Find the news index page
-    news_index = Index.objects.live().first()
+    news_index = get_news_index()
     
     if not news_index:
         # Handle case where news index doesn't exist
@@ -18,52 +21,58 @@ def tag_index(request, tag):
     # Find the tag object
     tag_instance = get_object_or_404(Tag, slug=tag)
     
-    # Get all news pages filtered by tag
-    newspages = NewsPage.objects.live().filter(tags__name=tag_instance.name).order_by('-date')
-    
-    # Pagination
-    page = request.GET.get('page')
-    paginator = Paginator(newspages, 50)  # Show 10 news items per page
-    try:
-        newspages = paginator.page(page)
-    except PageNotAnInteger:
-        newspages = paginator.page(1)
-    except EmptyPage:
-        newspages = paginator.page(paginator.num_pages)
+    # Get the news pages with this tag, unless the client has them already
+    def render_listing():
+        if page_number is None:
+            newspages = first_page(news_index, request.GET.get('page'), tag_instance.name)
+        else:
+            newspages = numbered_page(news_index, page_number, tag_instance.name)
+        return render(request, 'nieuws/index.html', {
+            'page': news_index,
+            'newspages': newspages,
+            'filter_tag': tag_instance.name,
+            'filter_tag_slug': tag_instance.slug,
+        })
     
-    return render(request, 'nieuws/index.html', {
-        'page': news_index,
-        'newspages': newspages,
-        'filter_tag': tag_instance.name,
-    })
+    return conditional_response(request, news_index.listing_validators, render_listing)
 
 def paginated_index(request, page_number):
     """
     View function for displaying paginated news items
     """
     # Find the news index page
-    news_index = Index.objects.live().first()
+    news_index = get_news_index()
     
     if not news_index:
         # Handle case where news index doesn't exist
         return render(request, '404.html', {}, status=404)
     
-    # Get all news pages
-    newspages = NewsPage.objects.live().child_of(news_index).order_by('-date')
+    # Get the news pages, filtered by tag if specified in URL query params,
+    # unless the client has them already
+    def render_listing():
+        return render(request, 'nieuws/index.html', {
+            'page': news_index,
+            'newspages': numbered_page(news_index, page_number, request.GET.get('tag')),
+        })
     
-    # Filter by tag if specified in URL query params
-    tag = request.GET.get('tag')
-    if tag:
-        newspages = newspages.filter(tags__name=tag)
+    return conditional_response(request, news_index.listing_validators, render_listing)
+
+def keyset_index(request, direction, cursor):
+    """
+    View function for displaying the news items just older or newer than a cursor
+    """
+    # Find the news index page
+    news_index = get_news_index()
+    
+    if not news_index:
+        # Handle case where news index doesn't exist
+        return render(request, '404.html', {}, status=404)
     
-    # Pagination
-    paginator = Paginator(newspages, 10)  # Show 10 news items per page
+    # Get the news pages, filtered by tag if specified in URL query params
     try:
-        newspages = paginator.page(page_number)
-    except PageNotAnInteger:
-        newspages = paginator.page(1)
-    except EmptyPage:
-        newspages = paginator.page(paginator.num_pages)
+        newspages = cursor_page(news_index, direction, cursor, request.GET.get('tag'))
+    except ValueError:
+        raise Http404("Invalid cursor")
     
     return render(request, 'nieuws/index.html', {
         'page': news_index,
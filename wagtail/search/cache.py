@@ -0,0 +1,105 @@
+"""
+Cache of site search results.
+
+The first SEARCH_CACHE_RESULTS result ids of a query are cached together
+with the total count, so paging through a search and repeating a popular
+query only fetch the pages shown. Queries are normalised first, so "Daken"
+and " daken" share their entry. Keys include a generation number that
+search.signals bumps whenever a page is published, unpublished or deleted;
+entries also expire after SEARCH_CACHE_TIMEOUT seconds.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core import paginator as pagination
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from wagtail.models import Page
+from wagtail.search.backends import get_search_backend
+
+from .dutch import strip_accents
+
+RESULTS_PER_PAGE = 10
+GENERATION_KEY = 'search:results:generation'
+
+
+def get_generation():
+    return cache.get_or_set(GENERATION_KEY, time.time_ns, None)
+
+
+def bump_generation():
+    """Invalidate all cached search results. Returns the new generation."""
+    generation = time.time_ns()
+    cache.set(GENERATION_KEY, generation, None)
+    return generation
+
+
+def normalise_query(query_string):
+    """Casefold a query, strip its accents and collapse its whitespace."""
+    return ' '.join(strip_accents(query_string).casefold().split())
+
+
+def search_backend():
+    """
+    SEARCH_BACKEND, or the default backend while its index is still empty.
+
+    The FTS5 index starts empty after its migration and is only filled by
+    `update_index --backend fts5`; Wagtail's default index is kept up to
+    date all along, so searches keep finding pages in the meantime.
+    """
+    name = getattr(settings, 'SEARCH_BACKEND', 'default')
+    is_empty = getattr(get_search_backend(name), 'is_empty', None)
+    if is_empty is not None and is_empty():
+        return 'default'
+    return name
+
+
+def search_pages(query_string):
+    return Page.objects.live().search(query_string, backend=search_backend())
+
+
+def cached_results(query_string):
+    """The total count and the first result ids of a normalised query."""
+    query_key = hashlib.md5(query_string.encode('utf-8')).hexdigest()
+    key = f'search:results:{get_generation()}:{query_key}'
+    cached = cache.get(key)
+    if cached is None:
+        results = search_pages(query_string)
+        cached = {
+            'count': results.count(),
+            'ids': [page.pk for page in results[:getattr(settings, 'SEARCH_CACHE_RESULTS', 200)]],
+        }
+        cache.set(key, cached, getattr(settings, 'SEARCH_CACHE_TIMEOUT', 10 * 60))
+    return cached
+
+
+def search_page(query_string, number, per_page=RESULTS_PER_PAGE):
+    """
+    Get a numbered page of the search results, like Paginator.page().
+
+    Invalid page numbers fall back to the first page, numbers past the end
+    to the last page. Pages past the cached ids are searched for again.
+    """
+    query_string = normalise_query(query_string)
+    cached = cached_results(query_string)
+
+    paginator = Paginator(cached['ids'], per_page)
+    paginator.count = cached['count']
+    try:
+        number = paginator.validate_number(number)
+    except PageNotAnInteger:
+        number = 1
+    except EmptyPage:
+        number = paginator.num_pages
+
+    bottom = (number - 1) * per_page
+    top = min(bottom + per_page, paginator.count)
+    if top <= len(cached['ids']):
+        ids = cached['ids'][bottom:top]
+        pages = Page.objects.live().in_bulk(ids)
+        object_list = [pages[pk] for pk in ids if pk in pages]
+    else:
+        object_list = list(search_pages(query_string)[bottom:top])
+
+    return pagination.Page(object_list, number, paginator)
@@ -0,0 +1,158 @@
+"""
+Dutch text analysis for the FTS5 search backend.
+
+stem() is the Snowball Dutch stemmer
+(https://snowballstem.org/algorithms/dutch/stemmer.html), so that "daken"
+finds "dak" and "schilderen" finds "schilder"; tokenize() lowercases,
+strips accents and stems every word of a text; term_offsets() records where
+each stemmed word occurs. html_to_text() gets the text to analyse out of
+rich text.
+"""
+import re
+import unicodedata
+from html import unescape
+
+from django.utils.html import strip_tags
+
+VOWELS = 'aeiouyè'
+WORD_RE = re.compile(r'\w+')
+# Tags after which the text continues as a new word
+BLOCK_END_RE = re.compile(r'</(?:p|h[1-6]|li|blockquote|pre|div|td|th)>|<br\s*/?>', re.IGNORECASE)
+
+
+def strip_accents(text):
+    return ''.join(
+        char for char in unicodedata.normalize('NFKD', text)
+        if not unicodedata.combining(char)
+    )
+
+
+def is_vowel(char):
+    return char in VOWELS
+
+
+def regions(word):
+    """The start of R1 and R2: after the first non-vowel that follows a vowel."""
+    def region_after(start):
+        for i in range(start + 1, len(word)):
+            if not is_vowel(word[i]) and is_vowel(word[i - 1]):
+                return i + 1
+        return len(word)
+
+    r1 = region_after(0)
+    r2 = region_after(r1) if r1 < len(word) else len(word)
+    # R1 is at least 3 letters in, but R2 is found from where R1 really starts
+    return max(r1, 3), r2
+
+
+def undouble(word):
+    if word.endswith(('kk', 'dd', 'tt')):
+        return word[:-1]
+    return word
+
+
+def valid_s_ending(word):
+    return bool(word) and not is_vowel(word[-1]) and word[-1] != 'j'
+
+
+def valid_en_ending(word):
+    return bool(word) and not is_vowel(word[-1]) and not word.endswith('gem')
+
+
+def mark_consonants(word):
+    """Mark y and i that behave as consonants as Y and I."""
+    chars = list(word)
+    if chars and chars[0] == 'y':
+        chars[0] = 'Y'
+    for i in range(1, len(chars)):
+        if chars[i] == 'y' and is_vowel(chars[i - 1]):
+            chars[i] = 'Y'
+        elif chars[i] == 'i' and is_vowel(chars[i - 1]) and i + 1 < len(chars) and is_vowel(chars[i + 1]):
+            chars[i] = 'I'
+    return ''.join(chars)
+
+
+def stem(word):
+    """Stem a lowercase Dutch word."""
+    word = strip_accents(word)
+    if len(word) <= 2:
+        return word
+    word = mark_consonants(word)
+    r1, r2 = regions(word)
+
+    # Step 1
+    if word.endswith('heden'):
+        if len(word) - 5 >= r1:
+            word = word[:-5] + 'heid'
+    elif word.endswith(('ene', 'en')):
+        suffix = 3 if word.endswith('ene') else 2
+        if len(word) - suffix >= r1 and valid_en_ending(word[:-suffix]):
+            word = undouble(word[:-suffix])
+    elif word.endswith(('se', 's')):
+        suffix = 2 if word.endswith('se') else 1
+        if len(word) - suffix >= r1 and valid_s_ending(word[:-suffix]):
+            word = word[:-suffix]
+
+    # Step 2
+    e_removed = False
+    if word.endswith('e') and len(word) - 1 >= r1 and len(word) > 1 and not is_vowel(word[-2]):
+        word = undouble(word[:-1])
+        e_removed = True
+
+    # Step 3a
+    if word.endswith('heid') and len(word) - 4 >= r2 and not word[:-4].endswith('c'):
+        word = word[:-4]
+        if word.endswith('en') and len(word) - 2 >= r1 and valid_en_ending(word[:-2]):
+            word = undouble(word[:-2])
+
+    # Step 3b
+    if word.endswith(('end', 'ing')):
+        if len(word) - 3 >= r2:
+            word = word[:-3]
+            if word.endswith('ig') and len(word) - 2 >= r2 and not word[:-2].endswith('e'):
+                word = word[:-2]
+            else:
+                word = undouble(word)
+    elif word.endswith('ig'):
+        if len(word) - 2 >= r2 and not word[:-2].endswith('e'):
+            word = word[:-2]
+    elif word.endswith('lijk'):
+        if len(word) - 4 >= r2:
+            word = word[:-4]
+            if word.endswith('e') and len(word) - 1 >= r1 and len(word) > 1 and not is_vowel(word[-2]):
+                word = undouble(word[:-1])
+    elif word.endswith('baar'):
+        if len(word) - 4 >= r2:
+            word = word[:-4]
+    elif word.endswith('bar'):
+        if len(word) - 3 >= r2 and e_removed:
+            word = word[:-3]
+
+    # Step 4: undouble the vowel of a final consonant-vowel-vowel-consonant
+    if (
+        len(word) >= 4
+        and word[-4] not in VOWELS
+        and word[-3:-1] in ('aa', 'ee', 'oo', 'uu')
+        and word[-1] not in VOWELS and word[-1] != 'I'
+    ):
+        word = word[:-2] + word[-1]
+
+    return word.replace('Y', 'y').replace('I', 'i')
+
+
+def html_to_text(html):
+    """The text of some HTML on one line, with a space where each block ends."""
+    return ' '.join(unescape(strip_tags(BLOCK_END_RE.sub(' ', html))).split())
+
+
+def tokenize(text):
+    """Lowercase and stem every word of a text."""
+    return [stem(word) for word in WORD_RE.findall(text.lower())]
+
+
+def term_offsets(text):
+    """Map the stem of every word of a text to the offsets where it starts."""
+    offsets = {}
+    for match in WORD_RE.finditer(text):
+        offsets.setdefault(stem(match.group().lower()), []).append(match.start())
+    return offsets
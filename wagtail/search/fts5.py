@@ -0,0 +1,239 @@
+"""
+SQLite FTS5 search backend for pages, with BM25 ranking and Dutch stemming.
+
+Configure it in WAGTAILSEARCH_BACKENDS:
+
+    "fts5": {
+        "BACKEND": "search.fts5",
+        "WEIGHTS": {"title": 10.0, "body": 1.0, "tags": 5.0},
+    }
+
+Each page is one row of the search_fts5 table (created by the search app's
+migrations), with its title, body text and tags stemmed by search.dutch, so
+the index and the queries use the same words. Rows are kept up to date by
+Wagtail's search signal handlers whenever a page is saved; rebuild with
+`manage.py update_index --backend fts5`. The migration creates the table
+empty, and search.cache uses the default backend until it has been filled.
+Only pages are indexed; searching anything else finds nothing.
+"""
+from django.db import DatabaseError, connection
+from django.db.models.expressions import RawSQL
+from wagtail.models import Page
+from wagtail.search.backends.base import (
+    BaseSearchBackend,
+    BaseSearchQueryCompiler,
+    BaseSearchResults,
+    EmptySearchResults,
+)
+from wagtail.search.query import And, MatchAll, Or, Phrase, PlainText
+
+from .dutch import html_to_text, tokenize
+
+TABLE = 'search_fts5'
+COLUMNS = ('title', 'body', 'tags')
+DEFAULT_WEIGHTS = {'title': 10.0, 'body': 1.0, 'tags': 5.0}
+
+
+def page_document(page):
+    """The stemmed title, body and tags of a page, as stored in the index."""
+    if type(page) is Page:
+        page = page.specific
+    body = getattr(page, 'body', None) or getattr(page, 'intro', None) or ''
+    tags = page.tags.all() if hasattr(page, 'tags') else []
+    return (
+        ' '.join(tokenize(page.title)),
+        ' '.join(tokenize(html_to_text(str(body)))),
+        ' '.join(tokenize(' '.join(tag.name for tag in tags))),
+    )
+
+
+def quote_terms(terms):
+    # Tokens are \w+ only, so quoting them is all the escaping they need
+    return [f'"{term}"' for term in terms]
+
+
+class FTS5Index:
+    name = TABLE
+
+    def add_model(self, model):
+        pass
+
+    def refresh(self):
+        pass
+
+    def reset(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLE}")
+
+    def is_empty(self):
+        """Whether nothing has been indexed, or the table doesn't exist."""
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT 1 FROM {TABLE} LIMIT 1")
+                return cursor.fetchone() is None
+        except DatabaseError:
+            return True
+
+    def add_item(self, obj):
+        self.add_items(type(obj), [obj])
+
+    def add_items(self, model, objs):
+        if not issubclass(model, Page):
+            return
+        rows = [(obj.pk, *page_document(obj)) for obj in objs]
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {TABLE} (rowid, title, body, tags) VALUES (%s, %s, %s, %s)", rows
+            )
+
+    def delete_item(self, obj):
+        if isinstance(obj, Page):
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {TABLE} WHERE rowid = %s", [obj.pk])
+
+
+class FTS5Rebuilder:
+    def __init__(self, index):
+        self.index = index
+
+    def start(self):
+        self.index.reset()
+        return self.index
+
+    def finish(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+
+
+class FTS5SearchQueryCompiler(BaseSearchQueryCompiler):
+    DEFAULT_OPERATOR = 'and'
+
+    def check(self):
+        # The queryset runs as a subquery of the search, so any filter works
+        pass
+
+    def _compile(self, query):
+        """Turn a Wagtail search query into an FTS5 query string; None matches everything."""
+        if isinstance(query, MatchAll):
+            return None
+        if isinstance(query, PlainText):
+            terms = quote_terms(tokenize(query.query_string))
+            if not terms:
+                return ''
+            return (' OR ' if query.operator == 'or' else ' ').join(terms)
+        if isinstance(query, Phrase):
+            terms = tokenize(query.query_string)
+            return f'"{" ".join(terms)}"' if terms else ''
+        if isinstance(query, And):
+            # Matching everything leaves the other parts to decide
+            parts = [part for part in map(self._compile, query.subqueries) if part is not None]
+            if '' in parts:
+                return ''
+            return ' AND '.join(f'({part})' for part in parts) if parts else None
+        if isinstance(query, Or):
+            parts = [self._compile(subquery) for subquery in query.subqueries]
+            if None in parts:
+                return None
+            return ' OR '.join(f'({part})' for part in parts if part)
+        raise NotImplementedError(f"The FTS5 backend does not support {type(query).__name__} queries")
+
+    def match_expression(self):
+        expression = self._compile(self.query)
+        if expression and self.fields:
+            columns = [field for field in self.fields if field in COLUMNS]
+            if not columns:
+                return ''
+            expression = f"{{{' '.join(columns)}}} : ({expression})"
+        return expression
+
+
+class FTS5SearchResults(BaseSearchResults):
+    def match(self):
+        return self.query_compiler.match_expression()
+
+    def ranked_ids(self, expression, limit, offset):
+        """The matching ids in the queryset, best first, with their BM25 scores."""
+        subquery, params = self.query_compiler.queryset.order_by().values('pk').query.sql_with_params()
+        weights = ', '.join(str(float(self.backend.weights[column])) for column in COLUMNS)
+        # bm25() gets very slow when SQLite applies the queryset filter inside
+        # the full-text scan, so score all matches first (SQLite 3.35+)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"WITH matches AS MATERIALIZED ("
+                f"SELECT rowid AS id, bm25({TABLE}, {weights}) AS rank FROM {TABLE} WHERE {TABLE} MATCH %s"
+                f") SELECT id, rank FROM matches WHERE id IN ({subquery}) "
+                f"ORDER BY rank LIMIT %s OFFSET %s",
+                [expression, *params, limit, offset],
+            )
+            return cursor.fetchall()
+
+    def _matching_queryset(self, expression):
+        queryset = self.query_compiler.queryset
+        if expression is not None:
+            queryset = queryset.filter(pk__in=RawSQL(f"SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s", [expression]))
+        return queryset
+
+    def _do_search(self):
+        expression = self.match()
+        if expression == '':
+            return []
+
+        queryset = self.query_compiler.queryset
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+
+        if expression is None or not self.query_compiler.order_by_relevance:
+            return list(self._matching_queryset(expression)[self.start:self.stop])
+
+        limit = -1 if self.stop is None else self.stop - self.start
+        ranked = self.ranked_ids(expression, limit, self.start)
+        objects = queryset.in_bulk([pk for pk, rank in ranked])
+        results = []
+        for pk, rank in ranked:
+            obj = objects.get(pk)
+            if obj is not None:
+                if self._score_field:
+                    # BM25 is lower for better matches; Wagtail scores are higher
+                    setattr(obj, self._score_field, -rank)
+                results.append(obj)
+        return results
+
+    def _do_count(self):
+        expression = self.match()
+        if expression == '':
+            return 0
+        count = self._matching_queryset(expression).count()
+        count -= self.start
+        if self.stop is not None:
+            count = min(count, self.stop - self.start)
+        return max(count, 0)
+
+
+class FTS5SearchBackend(BaseSearchBackend):
+    query_compiler_class = FTS5SearchQueryCompiler
+    results_class = FTS5SearchResults
+    rebuilder_class = FTS5Rebuilder
+
+    def __init__(self, params):
+        super().__init__(params)
+        self.weights = {**DEFAULT_WEIGHTS, **params.get('WEIGHTS', {})}
+        self.index = FTS5Index()
+
+    def get_index_for_model(self, model):
+        return self.index
+
+    def reset_index(self):
+        self.index.reset()
+
+    def is_empty(self):
+        return self.index.is_empty()
+
+    def _search(self, query_compiler_class, query, model_or_queryset, **kwargs):
+        model = getattr(model_or_queryset, 'model', model_or_queryset)
+        if not issubclass(model, Page):
+            return EmptySearchResults()
+        return super()._search(query_compiler_class, query, model_or_queryset, **kwargs)
+
+
+SearchBackend = FTS5SearchBackend
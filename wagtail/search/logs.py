@@ -0,0 +1,211 @@
+"""
+Search over the watch and reading logs of the Hugo site.
+
+The tables in content/gekeken/*.html and content/gelezen/*.html are parsed
+into Record tuples, newest first. Each column that can be filtered on has an
+index from its values to record positions, and the words of naam, ep and
+titel are kept in a sorted vocabulary, so a search is a few bisects and set
+intersections. Files are parsed again when their modification time changes,
+and the index is rebuilt from them. Searches check the files every time; the
+filter choices shown on every search page check them at most every
+SEARCH_LOGS_REFRESH_INTERVAL seconds. SEARCH_LOGS_DIR is the Hugo content
+directory.
+"""
+import bisect
+import glob
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+from datetime import date, datetime
+from html.parser import HTMLParser
+
+from django.conf import settings
+
+from .cache import normalise_query
+
+LOGS = ('gekeken', 'gelezen')
+WORD_RE = re.compile(r'\w+')
+
+Record = namedtuple('Record', 'datum type naam jaar ep titel rating log')
+
+
+class TableParser(HTMLParser):
+    """Collects the text of the td cells of every table row."""
+    def __init__(self):
+        super().__init__()
+        self.rows = []
+        self.row = None
+        self.cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'tr':
+            self.row = []
+        elif tag == 'td' and self.row is not None:
+            self.cell = []
+
+    def handle_endtag(self, tag):
+        if tag == 'td' and self.cell is not None:
+            self.row.append(' '.join(''.join(self.cell).split()))
+            self.cell = None
+        elif tag == 'tr' and self.row is not None:
+            if self.row:
+                self.rows.append(self.row)
+            self.row = None
+
+    def handle_data(self, data):
+        if self.cell is not None:
+            self.cell.append(data)
+
+
+def parse_date(text):
+    """Dates are written 2020-01-01 Wed 02:04, 2024-01-02 20:56 or 02/01/2024."""
+    for value, date_format in ((text[:10], '%Y-%m-%d'), (text, '%d/%m/%Y')):
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            pass
+    return None
+
+
+def parse_year(text):
+    return int(text) if text.isdigit() else None
+
+
+def parse_rating(text):
+    """★★★½ and **1/2 are 3.5 and 2.5; no stars is no rating."""
+    stars = text.count('★') + text.count('*')
+    half = '½' in text or '1/2' in text
+    if not stars and not half:
+        return None
+    return stars + (0.5 if half else 0)
+
+
+def parse_row(log, cells):
+    if log == 'gekeken':
+        number, datum, kind, naam, jaar, ep, titel, rating = cells
+    else:
+        datum, naam, reeks, number, titel, jaar, pages, rating = cells
+        kind = 'boek'
+        ep = f"{reeks} #{number}" if reeks and number else reeks
+    return Record(parse_date(datum), kind.lower(), naam, parse_year(jaar), ep, titel, parse_rating(rating), log)
+
+
+def parse_log(log, filename):
+    parser = TableParser()
+    with open(filename, encoding='utf-8') as f:
+        parser.feed(f.read())
+    return [parse_row(log, cells) for cells in parser.rows if len(cells) == 8]
+
+
+def log_files(directory):
+    return sorted(
+        (log, filename)
+        for log in LOGS
+        for filename in glob.glob(os.path.join(directory, log, '*.html'))
+        if not os.path.basename(filename).startswith('_')
+    )
+
+
+class LogIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Filename -> (modification time, records)
+        self.files = {}
+        # None until the logs are first read
+        self.records = None
+        self.columns = {}
+        self.words = {}
+        self.vocabulary = []
+        # The directory and time.monotonic() of the last refresh
+        self.checked = None
+
+    def load(self, records):
+        """Replace the index with a list of records."""
+        self.records = sorted(records, key=lambda record: record.datum or date.min, reverse=True)
+        self.columns = {column: {} for column in ('log', 'type', 'jaar', 'rating')}
+        self.words = {}
+        for position, record in enumerate(self.records):
+            for column, values in self.columns.items():
+                values.setdefault(getattr(record, column), set()).add(position)
+            for word in WORD_RE.findall(normalise_query(f"{record.naam} {record.ep} {record.titel}")):
+                self.words.setdefault(word, set()).add(position)
+        self.vocabulary = sorted(self.words)
+
+    def refresh(self, directory):
+        """Parse the files that were added or changed, and index them all again if any were."""
+        files = {}
+        for log, filename in log_files(directory):
+            mtime = os.stat(filename).st_mtime_ns
+            parsed = self.files.get(filename)
+            if not parsed or parsed[0] != mtime:
+                parsed = (mtime, parse_log(log, filename))
+            files[filename] = parsed
+        # Unchanged files keep the same (mtime, records) tuple
+        if self.records is None or files.keys() != self.files.keys() or any(
+            parsed is not self.files[filename] for filename, parsed in files.items()
+        ):
+            self.load([record for mtime, records in files.values() for record in records])
+        self.files = files
+        self.checked = (directory, time.monotonic())
+
+    def refresh_if_stale(self, directory, interval):
+        """Refresh, unless the directory was checked less than interval seconds ago."""
+        if self.checked and self.checked[0] == directory and time.monotonic() - self.checked[1] < interval:
+            return
+        self.refresh(directory)
+
+    def matching_word(self, prefix):
+        """The positions of records with a word starting with prefix."""
+        positions = set()
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        for word in self.vocabulary[start:]:
+            if not word.startswith(prefix):
+                break
+            positions |= self.words[word]
+        return positions
+
+    def search(self, query='', log=None, type=None, jaar=None, rating=None):
+        """
+        Records whose words start with each word of the query, newest first.
+
+        log, type and jaar must match exactly; rating is a minimum.
+        """
+        candidates = []
+        for column, value in (('log', log), ('type', type), ('jaar', jaar)):
+            if value is not None:
+                candidates.append(self.columns[column].get(value, set()))
+        if rating is not None:
+            candidates.append(set().union(*(
+                positions for value, positions in self.columns['rating'].items()
+                if value is not None and value >= rating
+            )))
+        candidates.extend(self.matching_word(word) for word in WORD_RE.findall(normalise_query(query)))
+
+        if not candidates:
+            return list(self.records or [])
+        candidates.sort(key=len)
+        positions = candidates[0].intersection(*candidates[1:])
+        return [self.records[position] for position in sorted(positions)]
+
+    def values(self, column):
+        """The distinct values of a column, for filter choices."""
+        return sorted(value for value in self.columns.get(column, {}) if value is not None)
+
+
+log_index = LogIndex()
+
+
+def search_logs(query='', **filters):
+    """Search the logs in SEARCH_LOGS_DIR, parsing them first if they changed."""
+    with log_index.lock:
+        log_index.refresh(settings.SEARCH_LOGS_DIR)
+        return log_index.search(query, **filters)
+
+
+def log_choices():
+    """The filter choices, from logs checked for changes at most every SEARCH_LOGS_REFRESH_INTERVAL seconds."""
+    with log_index.lock:
+        log_index.refresh_if_stale(settings.SEARCH_LOGS_DIR, getattr(settings, 'SEARCH_LOGS_REFRESH_INTERVAL', 60))
+        return {column: log_index.values(column) for column in ('log', 'type', 'jaar')}
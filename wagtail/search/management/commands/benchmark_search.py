@@ -0,0 +1,83 @@
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from wagtail.models import Page
+from nieuws.models import NewsPage
+
+WORDS = (
+    'huis dak daken gevel gevels raam ramen deur deuren tuin tuinen keuken badkamer trap trappen '
+    'aannemer aannemers schilder schilderen geschilderd verbouwing verbouwingen muur muren vloer '
+    'vloeren isolatie verwarming leiding leidingen elektriciteit planten boek boeken film films '
+    'gelezen gekeken regen zon winter zomer vandaag morgen gisteren eindelijk binnenkort nieuw oud '
+    'mooi lelijk groot klein werk werken gewerkt kapot hersteld steigers pannen goten zolder kelder'
+).split()
+QUERIES = ['dak', 'daken', 'gevel schilderen', 'aannemer verbouwing', 'zolder isolatie']
+
+class Command(BaseCommand):
+    help = (
+        'Compare search backends on growing numbers of generated news pages. '
+        'Everything is created in one transaction that is rolled back at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='Numbers of pages to search')
+        parser.add_argument('--backends', nargs='+', default=list(settings.WAGTAILSEARCH_BACKENDS), help='Search backends to compare')
+        parser.add_argument('--queries', nargs='+', default=QUERIES, help='Queries to run')
+        parser.add_argument('--repeat', type=int, default=10, help='Number of times each query is run')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed for the generated pages')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        
+        with transaction.atomic():
+            for size in sorted(options['sizes']):
+                self.grow_to(size)
+                self.stdout.write(self.style.SUCCESS(f"{NewsPage.objects.live().count()} news pages"))
+                for backend in options['backends']:
+                    for query in options['queries']:
+                        self.stdout.write(self.benchmark(backend, query, options['repeat']))
+            transaction.set_rollback(True)
+
+    def grow_to(self, size):
+        """Add generated news pages through the bulk importer until there are size of them."""
+        missing = size - NewsPage.objects.count()
+        if missing <= 0:
+            return
+        start = NewsPage.objects.count()
+        with tempfile.TemporaryDirectory() as content_dir:
+            os.makedirs(os.path.join(content_dir, 'nieuws'))
+            for number in range(start, start + missing):
+                with open(os.path.join(content_dir, 'nieuws', f'benchmark-{number}.md'), 'w', encoding='utf-8') as f:
+                    f.write(self.generate_post(number))
+            call_command('import_from_hugo', content_dir, '--bulk', stdout=StringIO())
+
+    def generate_post(self, number):
+        date = datetime(2010, 1, 1, tzinfo=timezone.utc) + timedelta(hours=number)
+        title = ' '.join(self.random.choices(WORDS, k=4)).capitalize()
+        tags = self.random.sample(WORDS, 2)
+        paragraphs = [' '.join(self.random.choices(WORDS, k=40)) for _ in range(3)]
+        return (
+            f"---\ntitle: \"{title} {number}\"\ndate: {date.isoformat()}\ntags: [{', '.join(tags)}]\n---\n\n"
+            + '\n\n'.join(paragraphs) + '\n'
+        )
+
+    def benchmark(self, backend, query, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results = Page.objects.live().search(query, backend=backend)
+            count = results.count()
+            list(results[:10])
+            timings.append((time.perf_counter() - start) * 1000)
+        return (
+            f"  {backend:<10} {query:<22} {count:>7} results  "
+            f"median {statistics.median(timings):8.2f} ms  max {max(timings):8.2f} ms"
+        )
@@ -0,0 +1,62 @@
+import random
+import statistics
+import time
+import tracemalloc
+from django.core.management.base import BaseCommand
+from search.suggest import SuggestIndex
+from search.management.commands.benchmark_search import WORDS
+
+class Command(BaseCommand):
+    help = (
+        'Measure the size and lookup time of the search suggestion index for '
+        'growing numbers of generated titles. Nothing is read from or written to the database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='Numbers of titles to index')
+        parser.add_argument('--lookups', type=int, default=10000, help='Number of lookups to time')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed for the generated titles')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        
+        for size in options['sizes']:
+            items = {
+                ('page', number): (f"{' '.join(self.random.choices(WORDS, k=4)).capitalize()} {number}", f"/nieuws/benchmark-{number}/")
+                for number in range(size)
+            }
+            
+            suggest_index = SuggestIndex()
+            start = time.perf_counter()
+            suggest_index.load(items, None)
+            build = time.perf_counter() - start
+            # Tracing allocations slows the build down, so it is measured apart
+            tracemalloc.start()
+            traced_index = SuggestIndex()
+            traced_index.load(items, None)
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del traced_index
+            
+            start = time.perf_counter()
+            for number in range(size, size + 100):
+                suggest_index.add('page', number, f"Nieuwe daken op de schuur {number}", f"/nieuws/nieuwe-daken-{number}/")
+            add = (time.perf_counter() - start) * 1000 / 100
+            
+            timings = []
+            for _ in range(options['lookups']):
+                word = self.random.choice(WORDS)
+                prefix = word[:self.random.randint(1, len(word))]
+                start = time.perf_counter()
+                suggest_index.lookup(prefix, 10)
+                timings.append((time.perf_counter() - start) * 1_000_000)
+            timings.sort()
+            
+            self.stdout.write(self.style.SUCCESS(
+                f"{size} titles: {len(suggest_index.entries)} keys, {memory / 1024 / 1024:.1f} MB, "
+                f"built in {build * 1000:.0f} ms, one page added in {add:.2f} ms"
+            ))
+            self.stdout.write(
+                f"  lookup median {statistics.median(timings):.1f} µs, "
+                f"p99 {timings[int(len(timings) * 0.99)]:.1f} µs, max {timings[-1]:.1f} µs"
+            )
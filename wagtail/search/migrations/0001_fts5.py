@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def create_fts5_table(apps, schema_editor):
+    # The table is only used by the search.fts5 backend, which needs SQLite
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_fts5 USING fts5("
+            "title, body, tags, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+
+
+def drop_fts5_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS search_fts5")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = []
+
+    operations = [
+        migrations.RunPython(create_fts5_table, drop_fts5_table),
+    ]
@@ -0,0 +1,34 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from taggit.models import Tag
+from wagtail.models import Page
+from wagtail.signals import page_published, page_unpublished, post_page_move
+
+from .cache import bump_generation, get_generation
+from .suggest import suggest_index
+
+
+def index_changed(page_id):
+    previous_generation = get_generation()
+    suggest_index.page_changed(page_id, previous_generation, bump_generation())
+
+
+@receiver(page_published)
+@receiver(page_unpublished)
+@receiver(post_delete)
+def page_changed(sender, instance, **kwargs):
+    if isinstance(instance, Page):
+        # Search indexes are updated once the transaction commits, so results
+        # cached before then would still be stale
+        transaction.on_commit(partial(index_changed, instance.pk))
+
+
+@receiver(post_page_move)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def urls_changed(sender, **kwargs):
+    # Suggestions link to pages and tag archives
+    transaction.on_commit(bump_generation)
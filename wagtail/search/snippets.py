@@ -0,0 +1,76 @@
+"""
+Highlighted snippets of the body of news pages in search results.
+
+News pages store the plain text of their body and the offsets of every
+stemmed word in it when they are published (NewsPage.prerender()), so a
+snippet is a lookup of the query's stems, a scan for the window with most
+of them, and escaping that window of text. No HTML is parsed per result.
+"""
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from nieuws.models import NewsPage
+
+from .dutch import WORD_RE, tokenize
+
+SNIPPET_LENGTH = 200
+
+
+def best_window(offsets, length):
+    """The first offset of the window of that length holding the most offsets."""
+    best_start, best_count = offsets[0], 0
+    end = 0
+    for i, start in enumerate(offsets):
+        while end < len(offsets) and offsets[end] < start + length:
+            end += 1
+        if end - i > best_count:
+            best_start, best_count = start, end - i
+    return best_start
+
+
+def highlight(text, terms, stems, length=SNIPPET_LENGTH):
+    """
+    A snippet of text around the words with one of the stems, marked.
+
+    terms maps stems to the offsets of their words in text. Without a match
+    the snippet is the start of the text.
+    """
+    offsets = sorted(offset for stem in stems for offset in terms.get(stem, ()))
+    start = 0
+    if offsets:
+        # The best window gets a quarter of the snippet of context before it,
+        # from a word boundary
+        context = length // 4
+        start = best_window(offsets, length - context)
+        start = text.rfind(' ', 0, max(start - context, 0)) + 1
+    end = start + length
+    if end < len(text):
+        # End on a word boundary too, unless the window is one long word
+        boundary = text.rfind(' ', start, end)
+        end = boundary if boundary > start else end
+    else:
+        end = len(text)
+
+    pieces = ['…'] if start > 0 else []
+    position = start
+    for offset in offsets:
+        if offset < start:
+            continue
+        if offset >= end:
+            break
+        word = WORD_RE.match(text, offset).group()
+        pieces += [escape(text[position:offset]), '<mark>', escape(word), '</mark>']
+        position = offset + len(word)
+    pieces.append(escape(text[position:end]))
+    if end < len(text):
+        pieces.append('…')
+    return mark_safe(''.join(pieces))
+
+
+def add_snippets(pages, query_string):
+    """Set the snippet of each news page in the results for a query."""
+    stems = set(tokenize(query_string))
+    extracts = NewsPage.objects.filter(pk__in=[page.pk for page in pages]).values_list('pk', 'body_text', 'body_terms')
+    snippets = {pk: highlight(text, terms, stems) for pk, text, terms in extracts if text}
+    for page in pages:
+        page.snippet = snippets.get(page.pk)
@@ -0,0 +1,48 @@
+// Suggest pages and tags below the search box while typing
+(function () {
+    var input = document.querySelector('input[data-suggest-url]');
+    if (!input) {
+        return;
+    }
+    var list = document.getElementById(input.getAttribute('aria-controls'));
+    var timer = null;
+    var controller = null;
+
+    function show(suggestions) {
+        list.innerHTML = '';
+        suggestions.forEach(function (suggestion) {
+            var item = document.createElement('li');
+            var link = document.createElement('a');
+            link.href = suggestion.url;
+            link.textContent = suggestion.type === 'tag' ? '#' + suggestion.label : suggestion.label;
+            item.appendChild(link);
+            list.appendChild(item);
+        });
+        list.hidden = suggestions.length === 0;
+    }
+
+    input.addEventListener('input', function () {
+        clearTimeout(timer);
+        timer = setTimeout(function () {
+            if (controller) {
+                controller.abort();
+            }
+            var query = input.value.trim();
+            if (!query) {
+                show([]);
+                return;
+            }
+            controller = new AbortController();
+            fetch(input.dataset.suggestUrl + '?query=' + encodeURIComponent(query), {signal: controller.signal})
+                .then(function (response) { return response.json(); })
+                .then(function (data) { show(data.suggestions); })
+                .catch(function () {});
+        }, 100);
+    });
+
+    input.addEventListener('keydown', function (event) {
+        if (event.key === 'Escape') {
+            show([]);
+        }
+    });
+})();
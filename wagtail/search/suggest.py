@@ -0,0 +1,145 @@
+"""
+Suggestions for the search box: live pages and tags whose title or name has
+a word starting with what was typed.
+
+Every title and tag name is indexed from each of its words onwards, in one
+sorted list that is searched with bisect, so "dak" suggests "Nieuwe daken".
+The index lives in each process and is kept up to date by search.signals
+when pages are published or unpublished in that process. When the search
+result generation (search.cache, in the shared default cache) has moved on
+without it, e.g. after a publish in another process, a background thread
+builds it again while requests are answered from the old one. Until the
+first build has finished there are no suggestions.
+"""
+import bisect
+import re
+import threading
+
+from django.db import connection
+from django.urls import reverse
+from taggit.models import Tag
+from wagtail.models import Page
+
+from nieuws.models import TagArchiveEntry
+
+from .cache import get_generation, normalise_query
+
+WORD_RE = re.compile(r'\w+')
+MAX_SUGGESTIONS = 20
+
+
+def index_keys(text):
+    """The normalised text from each of its words onwards."""
+    words = WORD_RE.findall(normalise_query(text))
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+def query_prefix(query_string):
+    return ' '.join(WORD_RE.findall(normalise_query(query_string)))
+
+
+class SuggestIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.generation = None
+        self.rebuilding = False
+        # Sorted (key, kind, id) tuples, and the (label, url) of each (kind, id)
+        self.entries = []
+        self.items = {}
+
+    def add(self, kind, item_id, label, url):
+        """Add or replace a suggestion."""
+        self.remove(kind, item_id)
+        self.items[kind, item_id] = (label, url)
+        for key in index_keys(label):
+            bisect.insort(self.entries, (key, kind, item_id))
+
+    def remove(self, kind, item_id):
+        item = self.items.pop((kind, item_id), None)
+        if item is None:
+            return
+        for key in index_keys(item[0]):
+            position = bisect.bisect_left(self.entries, (key, kind, item_id))
+            if position < len(self.entries) and self.entries[position] == (key, kind, item_id):
+                del self.entries[position]
+
+    def lookup(self, prefix, limit):
+        """Up to limit (kind, label, url) suggestions with a key starting with prefix."""
+        found = {}
+        position = bisect.bisect_left(self.entries, (prefix,))
+        while len(found) < limit and position < len(self.entries):
+            key, kind, item_id = self.entries[position]
+            if not key.startswith(prefix):
+                break
+            found.setdefault((kind, item_id), None)
+            position += 1
+        return [(kind, *self.items[kind, item_id]) for kind, item_id in found]
+
+    def rebuild(self, generation):
+        """Read all suggestions from the database and swap them in."""
+        items = {}
+        for page in Page.objects.live().public().exclude(depth=1).defer_streamfields():
+            url = page.get_url()
+            if url:
+                items['page', page.pk] = (page.title, url)
+        for tag in Tag.objects.filter(pk__in=TagArchiveEntry.objects.values('tag')):
+            items['tag', tag.pk] = (tag.name, reverse('tag_index', args=[tag.slug]))
+        with self.lock:
+            self.load(items, generation)
+
+    def run_rebuild(self, generation):
+        try:
+            self.rebuild(generation)
+        finally:
+            with self.lock:
+                self.rebuilding = False
+            connection.close()
+
+    def refresh(self):
+        """Start rebuilding the index in the background if it is stale."""
+        generation = get_generation()
+        with self.lock:
+            if generation == self.generation or self.rebuilding:
+                return
+            self.rebuilding = True
+        threading.Thread(target=self.run_rebuild, args=(generation,), name='search-suggest', daemon=True).start()
+
+    def load(self, items, generation):
+        """Replace the index with a {(kind, id): (label, url)} dict."""
+        self.items = items
+        self.entries = sorted(
+            (key, kind, item_id) for (kind, item_id), (label, url) in items.items() for key in index_keys(label)
+        )
+        self.generation = generation
+
+    def suggest(self, query_string, limit=10):
+        """Suggestions for a query from the current index."""
+        prefix = query_prefix(query_string)
+        if not prefix:
+            return []
+        self.refresh()
+        with self.lock:
+            return self.lookup(prefix, min(limit, MAX_SUGGESTIONS))
+
+    def page_changed(self, page_id, previous_generation, generation):
+        """
+        Update a page and its tags after the generation was bumped for it.
+
+        If the index had already missed another change it is left to be
+        rebuilt on next use.
+        """
+        with self.lock:
+            if self.generation != previous_generation:
+                return
+            page = Page.objects.live().public().filter(pk=page_id).exclude(depth=1).first()
+            url = page.get_url() if page else None
+            if url:
+                self.add('page', page.pk, page.title, url)
+                for tag in getattr(page.specific, 'tags', Tag.objects.none()).all():
+                    self.add('tag', tag.pk, tag.name, reverse('tag_index', args=[tag.slug]))
+            else:
+                self.remove('page', page_id)
+            self.generation = generation
+
+
+suggest_index = SuggestIndex()
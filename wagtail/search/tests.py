@@ -0,0 +1,315 @@
+import os
+from io import StringIO
+from datetime import date
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from wagtail.models import Page
+
+from nieuws.models import NewsPage
+from nieuws.tests import NewsTestCase
+
+from . import logs
+from .cache import bump_generation, get_generation, normalise_query, search_backend, search_page
+from .dutch import html_to_text, stem, term_offsets, tokenize
+from .logs import LogIndex, parse_rating
+from .snippets import highlight
+from .suggest import suggest_index
+
+
+class DutchStemmerTests(SimpleTestCase):
+    def test_snowball_examples(self):
+        examples = {
+            "lichamelijke": "licham",
+            "mogelijkheden": "mogelijk",
+            "aanbieding": "aanbied",
+            "daken": "dak",
+            "kinderen": "kinder",
+            "maan": "man",
+            "vrolijkheid": "vrolijk",
+            "opening": "open",
+            "amazing": "amaz",
+        }
+        for word, expected in examples.items():
+            with self.subTest(word=word):
+                self.assertEqual(stem(word), expected)
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("Daken, Gevels én ramen!"), ["dak", "gevel", "en", "ram"])
+
+    def test_html_to_text(self):
+        self.assertEqual(html_to_text("<h2>Daken</h2><p>Het dak<br>lekt &amp; <b>de</b>\ngevel</p>"), "Daken Het dak lekt & de gevel")
+
+
+class SearchTestCase(NewsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_page("Nieuwe daken", "<p>Het werk aan het huis begint.</p>", ["huis"])
+        self.add_page("Tuin", "<p>Eindelijk een nieuw dak op de schuur.</p>", ["tuin"])
+        self.add_page("Gevel", "<p>De gevel wordt geschilderd.</p>", ["dak"])
+
+    def add_page(self, title, body, tags):
+        news_page = NewsPage(title=title, slug=title.lower().replace(" ", "-"), date="2025-01-01T12:00:00Z", body=body)
+        self.index.add_child(instance=news_page)
+        news_page.tags.add(*tags)
+        self.publish(news_page)
+
+    def publish(self, news_page):
+        # Wagtail updates search indexes once the transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            news_page.save_revision().publish()
+
+
+
+class FTS5BackendTests(SearchTestCase):
+    def search(self, query, **kwargs):
+        return [page.title for page in Page.objects.live().search(query, backend="fts5", **kwargs)]
+
+    def test_stemmed_and_ranked(self):
+        # Title matches outrank tag matches, which outrank body matches
+        self.assertEqual(self.search("dak"), ["Nieuwe daken", "Gevel", "Tuin"])
+        self.assertEqual(self.search("geschilderd"), ["Gevel"])
+
+    def test_operator_and_fields(self):
+        self.assertEqual(self.search("dak huis"), ["Nieuwe daken"])
+        self.assertEqual(sorted(self.search("schuur gevel", operator="or")), ["Gevel", "Tuin"])
+        self.assertEqual(self.search("dak", fields=["tags"]), ["Gevel"])
+        self.assertEqual(self.search("!!"), [])
+
+    def test_words_split_between_blocks(self):
+        self.add_page("Schuur", "<p>Het dak lekt</p><p>Regen overal</p>", [])
+        self.assertEqual(self.search("regen"), ["Schuur"])
+        self.assertEqual(self.search("lekt"), ["Schuur"])
+
+    def test_follows_publishing(self):
+        news_page = NewsPage.objects.get(title="Tuin")
+        news_page.title = "Schuur"
+        self.publish(news_page)
+        self.assertEqual(self.search("schuren"), ["Schuur"])
+
+        news_page.unpublish()
+        self.assertEqual(self.search("schuur"), [])
+
+    def test_pagination_and_count(self):
+        results = Page.objects.live().search("dak", backend="fts5")
+        self.assertEqual(results.count(), 3)
+        self.assertEqual([page.title for page in results[1:3]], ["Gevel", "Tuin"])
+
+    def test_search_view(self):
+        response = self.client.get("/search/", {"query": "daken"})
+        self.assertContains(response, "Nieuwe daken")
+        self.assertContains(response, "Tuin")
+
+    def test_empty_index_falls_back(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM search_fts5")
+        self.assertEqual(search_backend(), "default")
+        self.assertContains(self.client.get("/search/", {"query": "schuur"}), "Tuin")
+
+        call_command("update_index", backend_name="fts5", stdout=StringIO())
+        self.assertEqual(search_backend(), "fts5")
+
+
+@override_settings(SEARCH_BACKEND="fts5")
+class SearchCacheTests(SearchTestCase):
+    def titles(self, query, number=1, per_page=10):
+        return [page.title for page in search_page(query, number, per_page)]
+
+    def test_normalise_query(self):
+        self.assertEqual(normalise_query("  Daken \t GEVÉLS "), "daken gevels")
+
+    def test_pages_served_from_cache(self):
+        self.assertEqual(self.titles("dak", 1, per_page=2), ["Nieuwe daken", "Gevel"])
+        with CaptureQueriesContext(connection) as queries:
+            page = search_page(" DAK ", 2, per_page=2)
+        self.assertEqual([result.title for result in page], ["Tuin"])
+        self.assertEqual(page.paginator.count, 3)
+        self.assertNotIn("search_fts5", " ".join(query["sql"] for query in queries))
+
+    @override_settings(SEARCH_CACHE_RESULTS=1)
+    def test_pages_past_cached_ids(self):
+        self.assertEqual(self.titles("dak", 1, per_page=2), ["Nieuwe daken", "Gevel"])
+        self.assertEqual(self.titles("dak", 2, per_page=2), ["Tuin"])
+
+    def test_publishing_invalidates(self):
+        self.assertEqual(self.titles("schuur"), ["Tuin"])
+        news_page = NewsPage.objects.get(title="Gevel")
+        news_page.body = "<p>De schuur wordt geschilderd.</p>"
+        self.publish(news_page)
+        self.assertEqual(sorted(self.titles("schuur")), ["Gevel", "Tuin"])
+
+
+class SuggestTests(SearchTestCase):
+    def setUp(self):
+        super().setUp()
+        # Background rebuilds would not see the pages of the test transaction
+        self.thread = self.enterContext(mock.patch("search.suggest.threading.Thread"))
+        suggest_index.rebuilding = False
+        suggest_index.rebuild(get_generation())
+
+    def suggest(self, query):
+        response = self.client.get("/search/suggest/", {"query": query})
+        return [(suggestion["type"], suggestion["label"]) for suggestion in response.json()["suggestions"]]
+
+    def test_word_prefixes(self):
+        self.assertEqual(self.suggest("DA"), [("tag", "dak"), ("page", "Nieuwe daken")])
+        self.assertEqual(self.suggest("nieuwe d"), [("page", "Nieuwe daken")])
+        self.assertEqual(self.suggest("gév"), [("page", "Gevel")])
+        self.assertEqual(self.suggest(" "), [])
+
+    def test_follows_publishing(self):
+        news_page = NewsPage.objects.get(title="Tuin")
+        news_page.title = "Schuur"
+        # Changes made in this process are applied without a rebuild
+        with mock.patch.object(suggest_index, "rebuild", side_effect=AssertionError):
+            self.publish(news_page)
+            self.assertEqual(self.suggest("sch"), [("page", "Schuur")])
+            self.assertEqual(self.suggest("tuin"), [("tag", "tuin")])
+            with self.captureOnCommitCallbacks(execute=True):
+                news_page.unpublish()
+            self.assertEqual(self.suggest("sch"), [])
+        self.thread.assert_not_called()
+
+    def test_rebuilt_in_background_when_stale(self):
+        # Like a publish in another process
+        NewsPage.objects.filter(title="Tuin").update(title="Schuur")
+        generation = bump_generation()
+
+        # The request is answered from the old index, which is rebuilt once
+        self.assertEqual(self.suggest("tuin"), [("page", "Tuin"), ("tag", "tuin")])
+        self.assertEqual(self.suggest("tuin"), [("page", "Tuin"), ("tag", "tuin")])
+        self.thread.assert_called_once()
+        self.assertEqual(self.thread.call_args.kwargs["args"], (generation,))
+
+        # What the thread runs, except for closing its database connection
+        with mock.patch("search.suggest.connection"):
+            suggest_index.run_rebuild(generation)
+        self.assertFalse(suggest_index.rebuilding)
+        self.assertEqual(self.suggest("sch"), [("page", "Schuur")])
+        self.thread.assert_called_once()
+
+
+GEKEKEN = """---
+title: Gezien in 2020
+---
+<table>
+    <tr><th>#</th><th>datum</th><th>type</th><th>naam</th><th>jaar</th><th>ep</th><th>titel</th><th>★</th></tr>
+    <tr><td>1</td><td>2020-01-01 Wed
+        02:04</td><td>serie</td><td>Rick and Morty</td><td>2017</td><td>s03e06</td><td>Rest and Ricklaxation</td><td>&#xa0;</td></tr>
+    <tr><td>2</td><td>2020-01-03 Fri 21:00</td><td>film</td><td>The Lighthouse</td><td>2019</td><td></td><td></td><td>★★★½</td></tr>
+</table>
+"""
+
+GELEZEN = """<table>
+    <thead><tr><th>Datum</th><th>Auteur</th><th>Reeks</th><th>#</th><th>Titel</th><th>Jaar</th><th>blz</th><th>rating</th></tr></thead>
+    <tbody>
+        <tr><td>02/01/2024</td><td>Elliott, Kate</td><td>Crown of Stars</td><td>4</td><td>Child of Fl&aacute;me</td><td>2000</td><td>925</td><td>★★★</td></tr>
+    </tbody>
+</table>
+"""
+
+
+class LogIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        for log, name, content in (("gekeken", "2020gekeken.html", GEKEKEN), ("gelezen", "2024gelezen.html", GELEZEN)):
+            os.makedirs(os.path.join(self.directory.name, log))
+            self.write(log, name, content)
+        self.index = LogIndex()
+        self.index.refresh(self.directory.name)
+
+    def write(self, log, name, content):
+        with open(os.path.join(self.directory.name, log, name), "w", encoding="utf-8") as f:
+            f.write(content)
+
+    def titles(self, query="", **filters):
+        return [record.naam for record in self.index.search(query, **filters)]
+
+    def test_records(self):
+        book, film, episode = self.index.records
+        self.assertEqual(book.datum, date(2024, 1, 2))
+        self.assertEqual((book.type, book.ep, book.titel, book.rating), ("boek", "Crown of Stars #4", "Child of Fláme", 3))
+        self.assertEqual((film.type, film.jaar, film.rating), ("film", 2019, 3.5))
+        self.assertEqual((episode.datum, episode.ep, episode.rating), (date(2020, 1, 1), "s03e06", None))
+        self.assertEqual(parse_rating("**1/2"), 2.5)
+
+    def test_search(self):
+        self.assertEqual(self.titles("rick"), ["Rick and Morty"])
+        self.assertEqual(self.titles("flame CROWN"), ["Elliott, Kate"])
+        self.assertEqual(self.titles(rating=3), ["Elliott, Kate", "The Lighthouse"])
+        self.assertEqual(self.titles("the", log="gekeken", type="film", jaar=2019), ["The Lighthouse"])
+        self.assertEqual(self.titles(type="opera"), [])
+        self.assertEqual(len(self.titles()), 3)
+
+    def test_reparses_changed_files(self):
+        records = self.index.records
+        self.index.refresh(self.directory.name)
+        self.assertIs(self.index.records, records)
+
+        self.write("gelezen", "2024gelezen.html", GELEZEN.replace("Elliott, Kate", "Gentle, Mary"))
+        os.utime(os.path.join(self.directory.name, "gelezen", "2024gelezen.html"), ns=(0, 1))
+        self.index.refresh(self.directory.name)
+        self.assertEqual(self.titles("gentle"), ["Gentle, Mary"])
+        self.assertEqual(self.titles("elliott"), [])
+
+
+class LogSearchViewTests(NewsTestCase):
+    def test_filters(self):
+        with TemporaryDirectory() as directory:
+            os.makedirs(os.path.join(directory, "gekeken"))
+            with open(os.path.join(directory, "gekeken", "2020gekeken.html"), "w", encoding="utf-8") as f:
+                f.write(GEKEKEN)
+            with override_settings(SEARCH_LOGS_DIR=directory):
+                response = self.client.get("/search/", {"type": "film", "jaar": "nope"})
+        self.assertContains(response, "The Lighthouse")
+        self.assertNotContains(response, "Rick and Morty")
+        self.assertEqual(response.context["log_filters"], {"type": "film"})
+
+    def test_choices_checked_periodically(self):
+        with TemporaryDirectory() as directory:
+            os.makedirs(os.path.join(directory, "gekeken"))
+            with open(os.path.join(directory, "gekeken", "2020gekeken.html"), "w", encoding="utf-8") as f:
+                f.write(GEKEKEN)
+            log_files = self.enterContext(mock.patch.object(logs, "log_files", wraps=logs.log_files))
+            with override_settings(SEARCH_LOGS_DIR=directory):
+                response = self.client.get("/search/")
+                self.assertEqual(response.context["log_choices"]["type"], ["film", "serie"])
+                self.client.get("/search/")
+                self.assertEqual(log_files.call_count, 1)
+
+                # Searches always look for changed files
+                self.client.get("/search/", {"query": "rick"})
+                self.assertEqual(log_files.call_count, 2)
+                with override_settings(SEARCH_LOGS_REFRESH_INTERVAL=0):
+                    self.client.get("/search/")
+                self.assertEqual(log_files.call_count, 3)
+
+
+class SnippetTests(SearchTestCase):
+    def test_stored_at_publish(self):
+        news_page = NewsPage.objects.get(title="Gevel")
+        news_page.body = "<p>De gevel</p><p>wordt &amp; geschilderd.</p>"
+        self.publish(news_page)
+        news_page.refresh_from_db()
+        self.assertEqual(news_page.body_text, "De gevel wordt & geschilderd.")
+        self.assertEqual(news_page.body_terms, term_offsets(news_page.body_text))
+        self.assertEqual(news_page.body_terms["gevel"], [3])
+
+    def test_highlight(self):
+        text = " ".join(f"woord{number}" for number in range(100)) + " <daken> en een dak."
+        snippet = highlight(text, term_offsets(text), {"dak"}, length=60)
+        self.assertTrue(snippet.startswith("…woord"))
+        self.assertTrue(snippet.endswith("&lt;<mark>daken</mark>&gt; en een <mark>dak</mark>."))
+        self.assertEqual(highlight("Geen treffer hier", {}, {"dak"}, length=10), "Geen…")
+
+    def test_search_view(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/search/", {"query": "Geschilderd"})
+        self.assertContains(response, "De gevel wordt <mark>geschilderd</mark>.")
+        # The snippets come from one query on the stored text, not the page bodies
+        self.assertEqual(sum("body_terms" in query["sql"] for query in queries), 1)
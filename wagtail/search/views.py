@@ -1,8 +1,14 @@
-from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.core.paginator import Paginator
+from django.http import JsonResponse
 from django.template.response import TemplateResponse
 
 from wagtail.models import Page
 
+from .cache import RESULTS_PER_PAGE, search_page
+from .logs import log_choices, search_logs
+from .snippets import add_snippets
+from .suggest import suggest_index
+
 # To enable logging of search queries for use with the "Promoted search results" module
 # <https://docs.wagtail.org/en/stable/reference/contrib/searchpromotions.html>
 # uncomment the following line and the lines indicated in the search function
@@ -11,13 +17,32 @@ from wagtail.models import Page
 # from wagtail.contrib.search_promotions.models import Query
 
 
+LOG_RECORDS_PER_PAGE = 50
+
+
+def log_filters(request):
+    """The log filters in the query string; values that don't parse are left out."""
+    filters = {}
+    for name, convert in (("log", str), ("type", str), ("jaar", int), ("rating", float)):
+        try:
+            value = convert(request.GET.get(name, ""))
+        except ValueError:
+            continue
+        if value:
+            filters[name] = value
+    return filters
+
+
 def search(request):
     search_query = request.GET.get("query", None)
     page = request.GET.get("page", 1)
+    filters = log_filters(request)
 
     # Search
     if search_query:
-        search_results = Page.objects.live().search(search_query)
+        # Cached per normalised query; see search/cache.py
+        search_results = search_page(search_query, page)
+        add_snippets(search_results, search_query)
 
         # To log this query for use with the "Promoted search results" module:
 
@@ -25,16 +50,15 @@ def search(request):
         # query.add_hit()
 
     else:
-        search_results = Page.objects.none()
+        search_results = Paginator(Page.objects.none(), RESULTS_PER_PAGE).page(1)
 
-    # Pagination
-    paginator = Paginator(search_results, 10)
-    try:
-        search_results = paginator.page(page)
-    except PageNotAnInteger:
-        search_results = paginator.page(1)
-    except EmptyPage:
-        search_results = paginator.page(paginator.num_pages)
+    # The watch and reading logs, searched by their words and filtered by column
+    if search_query or filters:
+        log_records = Paginator(search_logs(search_query or "", **filters), LOG_RECORDS_PER_PAGE).get_page(
+            request.GET.get("logpage")
+        )
+    else:
+        log_records = None
 
     return TemplateResponse(
         request,
@@ -42,5 +66,22 @@ def search(request):
         {
             "search_query": search_query,
             "search_results": search_results,
+            "log_records": log_records,
+            "log_filters": filters,
+            "log_choices": log_choices(),
         },
     )
+
+
+def suggest(request):
+    """Suggested pages and tags for what has been typed in the search box."""
+    try:
+        limit = int(request.GET.get("limit", 10))
+    except ValueError:
+        limit = 10
+    suggestions = suggest_index.suggest(request.GET.get("query", ""), max(limit, 1))
+    return JsonResponse({
+        "suggestions": [
+            {"type": kind, "label": label, "url": url} for kind, label, url in suggestions
+        ],
+    })